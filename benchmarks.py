@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# benchmarks.py
+
+# Benchmarks reproducibles del pipeline: evaluación de sigma, muestreo de
+# curvas, intersección, mallado y exportación, con los parámetros de
+# ejemplo del repositorio y discretizaciones de hasta millones de
+# triángulos. Los resultados se guardan en JSON y se comparan con
+# benchmark_baseline.json.
+#
+#   python benchmarks.py                  # todos los tamaños
+#   python benchmarks.py --quick          # solo tamaños pequeños
+#   python benchmarks.py --save-baseline  # actualiza la referencia
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from singlet import SigmaCurve, OmegaLens, sigma, solve_lens_batch
+from surface_generation import (revolve_curve, update_revolved,
+                                generate_mesh_from_vertices_numpy, clear_face_cache,
+                                export_to_stl, export_revolved_stl, export_mesh)
+
+SEED = 1234
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, "benchmark_baseline.json")
+
+PARAM_FILES = ['cola/params.json'] + sorted(
+    os.path.relpath(p, HERE) for p in glob.glob(os.path.join(HERE, 'backup/backup_params/*.json')))
+
+# (N_RHO, N_ANG): la malla uniforme tiene ~8·N_RHO·N_ANG triángulos
+SIZES = [(10, 10), (100, 100), (300, 300), (1000, 500)]
+QUICK_SIZES = SIZES[:2]
+
+# Exportadores de texto: solo hasta este número de triángulos
+MAX_TEXT_TRIANGLES = 1_000_000
+MAX_ASCII_STL_TRIANGLES = 100_000
+
+
+def timeit(func, min_time=0.2, max_repeat=5):
+    """Mejor tiempo de varias ejecuciones (una sola si la primera ya es lenta)."""
+    best = np.inf
+    total = 0.0
+    for _ in range(max_repeat):
+        t0 = time.perf_counter()
+        func()
+        dt = time.perf_counter() - t0
+        best = min(best, dt)
+        total += dt
+        if total > min_time:
+            break
+    return best
+
+
+def load_params(path):
+    with open(os.path.join(HERE, path), "r") as f:
+        return json.load(f)
+
+
+def bench_curves(name, params, results):
+    rng = np.random.default_rng(SEED)
+    z0, z1, z2 = params['z0'], params['z1'], params['z2']
+    n0, n1, t = params['n0'], params['n1'], params.get('t', 0.0)
+
+    rho = rng.uniform(0.0, 10.0, 1_000_000)
+    results[f"{name}/sigma/vector_1e6"] = timeit(lambda: sigma(z0, z1, rho, n0, n1))
+    rho_s = rho[:10_000].tolist()
+    results[f"{name}/sigma/scalar_1e4"] = timeit(
+        lambda: [sigma(z0, z1, x, n0, n1) for x in rho_s])
+
+    for n in (1_000, 100_000):
+        curve = SigmaCurve(z0, z1, n0, n1, rho_points=n)
+        results[f"{name}/get_points/{n}"] = timeit(curve.get_points)
+
+    results[f"{name}/omega_lens"] = timeit(lambda: OmegaLens.from_params(params, 10))
+    lens = OmegaLens.from_params(params, 10)
+    results[f"{name}/omega_lens_replace_t"] = timeit(lambda: lens.replace(t=t + 1e-3))
+
+    n = 10_000
+    jitter = rng.normal(1.0, 0.01, n)
+    results[f"{name}/solve_lens_batch/{n}"] = timeit(
+        lambda: solve_lens_batch(z0, z1*jitter, z2, n0, n1, t))
+
+
+def bench_mesh(name, params, n_rho, n_ang, tmp, results):
+    lens = OmegaLens.from_params(params, n_rho)
+    curve = lens.get_points()
+    tag = f"{name}/{n_rho}x{n_ang}"
+    n_theta, n_phi = len(curve), 2*n_ang
+
+    results[f"{tag}/revolve_curve"] = timeit(lambda: revolve_curve(curve, n_ang))
+    results[f"{tag}/revolve_curve_watertight"] = timeit(
+        lambda: revolve_curve(curve, n_ang, watertight=True))
+
+    def faces_cold():
+        clear_face_cache()
+        generate_mesh_from_vertices_numpy(n_theta, n_phi)
+    results[f"{tag}/faces_numpy"] = timeit(faces_cold)
+    results[f"{tag}/faces_numpy_cached"] = timeit(
+        lambda: generate_mesh_from_vertices_numpy(n_theta, n_phi))
+
+    vertices, faces = revolve_curve(curve, n_ang, watertight=True)
+    moved = lens.replace(t=params.get('t', 0.0) + 1e-3).get_points()
+    results[f"{tag}/revolve_update"] = timeit(
+        lambda: update_revolved(vertices.copy(), curve, moved, n_ang, watertight=True))
+    out = lambda ext: os.path.join(tmp, "bench." + ext)
+
+    results[f"{tag}/export_stl"] = timeit(lambda: export_to_stl(out("stl"), vertices, faces))
+    results[f"{tag}/export_stl_stream"] = timeit(
+        lambda: export_revolved_stl(out("stl"), curve, n_ang))
+    results[f"{tag}/export_ply"] = timeit(lambda: export_mesh(out("ply"), vertices, faces))
+    if len(faces) <= MAX_TEXT_TRIANGLES:
+        results[f"{tag}/export_obj"] = timeit(lambda: export_mesh(out("obj"), vertices, faces))
+        results[f"{tag}/export_3mf"] = timeit(lambda: export_mesh(out("3mf"), vertices, faces))
+    if len(faces) <= MAX_ASCII_STL_TRIANGLES:
+        results[f"{tag}/export_stl_ascii"] = timeit(
+            lambda: export_to_stl(out("stl"), vertices, faces, binary=False))
+
+
+def run(sizes, name_filter=None):
+    results = {}
+    errors = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in PARAM_FILES:
+            name = os.path.splitext(os.path.basename(path))[0] if 'backup' in path else path.split('/')[0]
+            if name_filter and name_filter not in name:
+                continue
+            params = load_params(path)
+            try:
+                bench_curves(name, params, results)
+                for n_rho, n_ang in sizes:
+                    bench_mesh(name, params, n_rho, n_ang, tmp, results)
+            except Exception as e:
+                errors[name] = f"{type(e).__name__}: {e}"
+    return results, errors
+
+
+def compare(results, baseline, threshold, min_time=1e-3):
+    """
+    Lista de (nombre, tiempo, referencia, cociente) más lentos que threshold.
+    Las medidas de referencia por debajo de min_time (s) son ruido y se ignoran.
+    """
+    slow = []
+    for key, value in sorted(results.items()):
+        ref = baseline.get(key)
+        if ref and ref >= min_time:
+            ratio = value / ref
+            if ratio > threshold:
+                slow.append((key, value, ref, ratio))
+    return slow
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del generador de lentes")
+    parser.add_argument("--quick", action="store_true", help="Solo tamaños pequeños")
+    parser.add_argument("--filter", default=None, help="Solo los parámetros cuyo nombre contenga esto")
+    parser.add_argument("--out", default=None, help="Guarda los resultados en este JSON")
+    parser.add_argument("--baseline", default=BASELINE, help="JSON de referencia")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Guarda los resultados como nueva referencia")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Cociente tiempo/referencia a partir del cual es una regresión")
+    args = parser.parse_args()
+
+    # Los exportadores imprimen una línea por archivo
+    sys.stdout, stdout = open(os.devnull, "w"), sys.stdout
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            results, errors = run(QUICK_SIZES if args.quick else SIZES, args.filter)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'seed': SEED,
+        },
+        'results': results,
+        'errors': errors,
+    }
+
+    for key, value in sorted(results.items()):
+        print(f"{key:60s} {value*1e3:10.3f} ms")
+    for name, err in errors.items():
+        print(f"{name}: error: {err}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)['results']
+        slow = compare(results, baseline, args.threshold)
+        for key, value, ref, ratio in slow:
+            print(f"REGRESSION {key}: {value*1e3:.3f} ms vs {ref*1e3:.3f} ms ({ratio:.2f}x)")
+        if slow:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# cache.py
+
+# Caché en disco de perfiles y mallas, direccionada por contenido.
+#
+# Cada entrada es un directorio <raíz>/<clave>/ con archivos .npy que se
+# cargan con mmap, y un meta.json. La clave es un hash de los parámetros
+# ópticos, la discretización y el código fuente del pipeline.
+#
+#   python main.py cache info
+#   python main.py cache invalidate [clave]
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from singlet import OmegaLens
+from surface_generation import revolve_curve
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "CARTESIAN_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "cartesian-surfaces"))
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+OPTICAL_KEYS = ('z0', 'z1', 'z2', 'n0', 'n1', 't')
+SOURCE_FILES = ('singlet.py', 'math_utils.py', 'surface_generation.py', 'cache.py')
+
+
+def code_version():
+    """Hash del código que produce las entradas; cambia si cambia el pipeline."""
+    h = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in SOURCE_FILES:
+        with open(os.path.join(here, name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+CODE_VERSION = code_version()
+
+
+def cache_key(params, **discretization):
+    """
+    Clave canónica: parámetros ópticos (físicos o G, O, T, S), discretización
+    y versión del código.
+    """
+    if 'sigma1' in params:
+        optical = {name: {k: float(v) for k, v in params[name].items()}
+                   for name in ('sigma1', 'sigma2')}
+        optical['t'] = float(params.get('t', 0.0))
+    else:
+        optical = {k: float(params.get(k, 0.0)) for k in OPTICAL_KEYS}
+    payload = json.dumps({'params': optical, 'disc': discretization,
+                          'code': CODE_VERSION},
+                         sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class MeshCache:
+    """
+    Caché LRU acotada en tamaño. get() devuelve los arreglos mapeados en
+    memoria (solo lectura) o None; put() guarda un dict de arreglos.
+    """
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def get(self, key):
+        path = self._path(key)
+        meta = os.path.join(path, "meta.json")
+        if not os.path.exists(meta):
+            return None
+        try:
+            with open(meta) as f:
+                names = json.load(f)['arrays']
+            out = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode='r')
+                   for name in names}
+        except (OSError, ValueError, KeyError):
+            return None
+        # Marca de uso para el orden LRU
+        os.utime(meta)
+        return out
+
+    def put(self, key, arrays, **meta):
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        # Escritura atómica: directorio temporal y rename
+        tmp = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+        try:
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmp, name + ".npy"), np.asarray(arr))
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(dict(meta, arrays=list(arrays)), f)
+            os.replace(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(path):
+                raise
+        self.evict()
+
+    def entries(self):
+        """Lista de (clave, bytes, último uso), de la más antigua a la más reciente."""
+        out = []
+        for key in os.listdir(self.root):
+            path = self._path(key)
+            meta = os.path.join(path, "meta.json")
+            if key.startswith(".") or not os.path.exists(meta):
+                continue
+            size = sum(e.stat().st_size for e in os.scandir(path))
+            out.append((key, size, os.stat(meta).st_mtime))
+        return sorted(out, key=lambda e: e[2])
+
+    def evict(self):
+        """Borra las entradas menos usadas hasta quedar por debajo de max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            total -= size
+
+    def invalidate(self, key=None):
+        """Borra una entrada, o toda la caché si key es None."""
+        keys = [key] if key is not None else [e[0] for e in self.entries()]
+        for k in keys:
+            shutil.rmtree(self._path(k), ignore_errors=True)
+        return len(keys)
+
+
+def lens_mesh(params, n_rho, n_ang, watertight=True, cache=None, dtype=np.float64):
+    """
+    Perfil, intersección y malla de la lente de params, desde la caché si
+    existe la entrada.
+
+    Retorna un dict con 'profile' (N x 2), 'intersection'
+    (rho1, rho2, z, r), 'vertices' (de tipo dtype) y 'faces'.
+    """
+    dtype = np.dtype(dtype)
+    key = None
+    if cache is not None:
+        key = cache_key(params, n_rho=n_rho, n_ang=n_ang, watertight=watertight,
+                        dtype=dtype.str)
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+
+    lens = OmegaLens.from_params(params, n_rho)
+    profile = lens.get_points()
+    vertices, faces = revolve_curve(profile, n_ang, watertight=watertight, dtype=dtype)
+    out = {
+        'profile': profile,
+        'intersection': np.array([*lens.rho_intersection, *lens.intersection_point]),
+        'vertices': vertices,
+        'faces': faces,
+    }
+
+    if cache is not None:
+        cache.put(key, out, params={k: v for k, v in params.items()
+                                    if k in OPTICAL_KEYS or k.startswith('sigma')},
+                  n_rho=n_rho, n_ang=n_ang)
+    return out
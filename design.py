@@ -0,0 +1,197 @@
+# design.py
+
+# Diseño inverso: valores de los parámetros libres (z1, z2 y/o t) con los
+# que la lente alcanza un diámetro, un espesor de borde o un espesor central
+# dados. Newton sobre los parámetros con derivadas por el teorema de la
+# función implícita y la intersección arrancada en caliente desde la
+# iteración anterior.
+#
+#   python main.py design --target diameter=25 --free z2
+#   python main.py design --target diameter=25 --target edge_thickness=1.5 \
+#       --free z2 --free t --edge-radius 10
+
+import numpy as np
+
+from math_utils import intersection_between_jets
+from profiling import profiled
+from singlet import OmegaLens, compile_sigma, is_first_crossing
+
+FREE_KEYS = ('z1', 'z2', 't')
+TARGETS = ('diameter', 'edge_thickness', 'center_thickness')
+
+
+def lens_curves(params):
+    """Σ₁ y Σ₂ compiladas de los parámetros físicos, como en OmegaLens.from_params."""
+    z0, z1, z2 = (float(params[k]) for k in ('z0', 'z1', 'z2'))
+    n0, n1, t = float(params['n0']), float(params['n1']), float(params.get('t', 0.0))
+    return compile_sigma(z0, z1, n0, n1), compile_sigma(-z1, z2, n1, n0, t)
+
+
+def rho_at_radius(f, h, rho0=None, tol=1e-13, max_iter=50):
+    """ρ del punto de la sigma f a distancia h del eje (Newton sobre r(ρ) = h)."""
+    rho = float(h if rho0 is None else rho0)
+    for _ in range(max_iter):
+        _, r, _, dr = f.zr_jet(rho)
+        step = (r - h) / dr
+        if not np.isfinite(step):
+            break
+        rho -= step
+        if abs(step) < tol * max(1.0, rho):
+            return rho
+    raise RuntimeError(f"no se encontró el punto de radio {h} cm en la superficie")
+
+
+def _partials(params, key, rho, h=1e-6):
+    """
+    ∂(z, r)/∂params[key] de Σ₁ en rho[0] y de Σ₂ en rho[1], a ρ fijo
+    (diferencias centradas sobre los coeficientes; sin resolver nada).
+    """
+    step = h * max(1.0, abs(params[key]))
+    out = []
+    for sign in (1, -1):
+        f1, f2 = lens_curves(dict(params, **{key: params[key] + sign*step}))
+        out.append(np.array((*f1.zr(rho[0]), *f2.zr(rho[1]))))
+    return (out[0] - out[1]) / (2*step)
+
+
+def evaluate(params, targets, free, rho, edge_radius=None):
+    """
+    Valores de targets y su Jacobiano respecto a free.
+
+    rho es el punto de partida: {'intersection': (ρ₁, ρ₂), 'edge': (ρ₁, ρ₂)}
+    (se actualiza con la solución). La intersección se resuelve con Newton
+    desde ahí (ValueError si no es el primer cruce); las derivadas dρ/dp salen de diferenciar F(ρ, p) = 0,
+    dρ/dp = -J⁻¹·∂F/∂p, sin volver a resolver la intersección.
+    """
+    f1, f2 = lens_curves(params)
+    rho_i = intersection_between_jets(f1.zr_jet, f2.zr_jet, *rho['intersection'])
+    _, r1, dz1, dr1 = f1.zr_jet(rho_i[0])
+    # Newton puede caer en un segundo cruce de Σ₁ con Σ₂ (como en OmegaLens)
+    if not (rho_i[0] > 0 and rho_i[1] > 0 and r1 > 0 and is_first_crossing(f1, f2, rho_i[0])):
+        raise ValueError("la intersección no es el primer cruce de Σ₁ con Σ₂")
+    rho['intersection'] = rho_i
+    _, _, dz2, dr2 = f2.zr_jet(rho_i[1])
+    J = np.array(((dz1, -dz2), (dr1, -dr2)))
+
+    if 'edge_thickness' in targets:
+        if edge_radius is None or not 0 <= edge_radius < r1:
+            raise ValueError("edge_thickness necesita 0 <= edge_radius < radio de la lente")
+        guess = rho.get('edge', (edge_radius, edge_radius))
+        rho_e = (rho_at_radius(f1, edge_radius, guess[0]),
+                 rho_at_radius(f2, edge_radius, guess[1]))
+        rho['edge'] = rho_e
+        jets = (f1.zr_jet(rho_e[0]), f2.zr_jet(rho_e[1]))
+
+    values = np.empty(len(targets))
+    jac = np.zeros((len(targets), len(free)))
+    for i, name in enumerate(targets):
+        if name == 'diameter':
+            values[i] = 2*r1
+        elif name == 'edge_thickness':
+            values[i] = jets[1][0] - jets[0][0]
+        else:
+            values[i] = float(params.get('t', 0.0))
+
+    for j, key in enumerate(free):
+        pz1, pr1, pz2, pr2 = _partials(params, key, rho_i)
+        drho = np.linalg.solve(J, -np.array((pz1 - pz2, pr1 - pr2)))
+        if 'edge_thickness' in targets:
+            # z a radio fijo: ∂z/∂p - (dz/dρ)/(dr/dρ)·∂r/∂p en cada sigma
+            ez1, er1, ez2, er2 = _partials(params, key, rho_e)
+            dedge = (ez2 - jets[1][2]/jets[1][3]*er2) - (ez1 - jets[0][2]/jets[0][3]*er1)
+        for i, name in enumerate(targets):
+            if name == 'diameter':
+                jac[i, j] = 2*(dr1*drho[0] + pr1)
+            elif name == 'edge_thickness':
+                jac[i, j] = dedge
+            else:
+                jac[i, j] = float(key == 't')
+    return values, jac
+
+
+@profiled("design")
+def solve_design(params, targets, free, edge_radius=None, tol=1e-10, max_iter=50):
+    """
+    Parámetros con los que la lente cumple targets.
+
+    Parámetros:
+      params:      parámetros físicos de partida (los de params.json)
+      targets:     dict objetivo -> valor, con objetivos de TARGETS (cm):
+                   'diameter', 'edge_thickness' (espesor axial z_Σ₂ - z_Σ₁ a
+                   la distancia edge_radius del eje) o 'center_thickness'
+      free:        parámetros que se pueden cambiar, de FREE_KEYS; al menos
+                   tantos como objetivos (si sobran, se toma el paso de
+                   norma mínima)
+
+    Retorna un dict con 'params' (los de partida con los libres resueltos),
+    'values' (objetivo -> valor alcanzado), 'iterations',
+    'rho_intersection' e 'intersection_point'.
+    """
+    if 'sigma1' in params:
+        raise ValueError("el diseño inverso necesita parámetros físicos")
+    names = list(targets)
+    free = list(free)
+    for name in names:
+        if name not in TARGETS:
+            raise ValueError(f"objetivo desconocido: {name} (se admiten {', '.join(TARGETS)})")
+    for key in free:
+        if key not in FREE_KEYS:
+            raise ValueError(f"parámetro libre no admitido: {key} (se admiten {', '.join(FREE_KEYS)})")
+    if len(free) < len(names):
+        raise ValueError("hace falta al menos un parámetro libre por objetivo")
+
+    params = dict(params)
+    params.setdefault('t', 0.0)
+    goal = np.array([float(targets[name]) for name in names])
+    rho = {'intersection': OmegaLens.from_params(params, 2).rho_intersection}
+
+    values, jac = evaluate(params, names, free, rho, edge_radius)
+    for it in range(max_iter):
+        res = values - goal
+        if np.max(np.abs(res)) < tol * max(1.0, np.max(np.abs(goal))):
+            break
+        dead = ~jac.any(axis=1)
+        if dead.any():
+            raise ValueError(f"{names[int(np.argmax(dead))]} no depende de "
+                             f"{', '.join(free)}")
+        step, *_ = np.linalg.lstsq(jac, -res, rcond=None)
+
+        # Paso amortiguado: se reduce a la mitad si la lente deja de
+        # existir o el residuo no baja
+        x = np.array([params[key] for key in free], dtype=float)
+        for _ in range(30):
+            trial = dict(params, **dict(zip(free, (x + step).tolist())))
+            saved = dict(rho)
+            try:
+                t_values, t_jac = evaluate(trial, names, free, rho, edge_radius)
+                if np.all(np.isfinite(t_values)) and \
+                        np.linalg.norm(t_values - goal) < np.linalg.norm(res):
+                    break
+            except (RuntimeError, ValueError, np.linalg.LinAlgError):
+                pass
+            rho.update(saved)
+            step = step / 2
+        else:
+            raise RuntimeError("el diseño inverso no avanza: objetivo fuera de alcance")
+        params, values, jac = trial, t_values, t_jac
+    else:
+        raise RuntimeError(f"el diseño inverso no convergió en {max_iter} iteraciones")
+
+    f1, _ = lens_curves(params)
+    rho_i = tuple(float(v) for v in rho['intersection'])
+    return {
+        'params': params,
+        'values': dict(zip(names, values.tolist())),
+        'iterations': it,
+        'rho_intersection': rho_i,
+        'intersection_point': f1.zr(rho_i[0]),
+    }
+
+
+def parse_targets(specs):
+    """['diameter=25', 't=3'] -> {'diameter': 25.0, ...}"""
+    targets = {}
+    for spec in specs:
+        key, _, value = spec.partition('=')
+        targets[key] = float(value)
+    return targets
@@ -1,59 +1,386 @@
+#!/usr/bin/env python3
+# main.py
 
-from singlet import SigmaCurve, OmegaLens
-from surface_generation import revolve_curve
-from viewer import show_vispy, info_view
+# Línea de comandos: generate, export, sweep, trace, tolerance, design, view
+# y cache.
+#
+# vispy, matplotlib y viewer solo se importan en el subcomando view, para
+# que generar y exportar funcione rápido y sin pantalla.
 
+import argparse
 import json
-from vispy import app
-import matplotlib.pyplot as plt
+import sys
 
-# Parámetros de discretización y visualización
+import numpy as np
+
+from cache import OPTICAL_KEYS
+from profiling import PROFILER
+from singlet import OmegaLens
+from surface_generation import (RevolvedMesh, revolve_curve, revolve_curve_adaptive,
+                                export_mesh)
+
+# Parámetros de discretización por defecto
 N_RHO = 10
 N_ANG = 10
-SHOW_3D = True
-SHOW_2D = True
 
-# Archivo de parámetros
+# Archivo de parámetros por defecto
 FILE_NAME = 'cola/params.json'
-with open(FILE_NAME, "r") as f:
-    params = json.load(f)
-
-# Lectura de parámetros ópticos
-z0 = params['z0']
-z1 = params['z1']
-z2 = params['z2']
-n0 = params['n0']
-n1 = params['n1']
-t = params.get('t', 0.0)
-
-# Construcción de curvas Sigma
-sigma1 = SigmaCurve(z0, z1, n0, n1, rho_points=N_RHO)
-sigma2 = SigmaCurve(-z1, z2, n1, n0, rho_points=N_RHO, t_shift=t)
-
-# Lente a partir de las dos curvas
-lens = OmegaLens(sigma1, sigma2)
-intersection_point = lens.intersection_point
-curve = lens.get_points()
-
-print(f'Intersection point at (z,r) = {intersection_point}')
-print(f'===== Lens Data =====')
-print(f'Object and image positions z0 = {z0} cm, zi = {z2} cm')
-print(f'width = {t} cm')
-print(f'diameter = {2 * intersection_point[1]} cm')
-
-# Malla 3D de la lente
-vertices, faces = revolve_curve(curve, N_ANG)
-
-if SHOW_3D:
-    show_vispy(vertices, faces, SHOW_WIREFRAME=True)
-
-if SHOW_2D:
-    # Vista 3D
-    info_view(
-        sigma1.get_points(),
-        sigma2.get_points(),
-        curve,
-        intersection_point,
-        width=t,
-        diameter=2*intersection_point[1]
-    )
+
+
+def load_params(args):
+    """Parámetros del JSON, sobrescritos por los que se pasen como opciones."""
+    with open(args.params, "r") as f:
+        params = json.load(f)
+    for key in OPTICAL_KEYS:
+        value = getattr(args, key)
+        if value is not None:
+            params[key] = value
+    params.setdefault('t', 0.0)
+    return params
+
+
+def resolve_discretization(args, params):
+    """Con --tol-um, N_RHO y N_ANG mínimos que cumplen la tolerancia."""
+    if args.tol_um is None:
+        return
+    from mesh_error import auto_discretization
+    res = auto_discretization(params, args.tol_um, watertight=not args.open_ends)
+    args.n_rho, args.n_ang = res['n_rho'], res['n_ang']
+    print(f"N_RHO = {args.n_rho}, N_ANG = {args.n_ang}: "
+          f"error {res['error_um']:.3f} µm, {res['n_faces']} triángulos")
+
+
+def build_lens(args, params):
+    curve_kw = {}
+    if args.chord_tol is not None:
+        curve_kw['chord_tol'] = args.chord_tol
+    return OmegaLens.from_params(params, args.n_rho, **curve_kw)
+
+
+def mesh_dtype(args):
+    return np.float32 if args.float32 else np.float64
+
+
+def build_mesh(args, lens, normals=False):
+    """Vértices y caras de la lente; con normals, también las normales analíticas."""
+    curve = lens.get_points()
+    tangents = lens.get_tangents() if normals else None
+    if args.sag_tol is not None:
+        return revolve_curve_adaptive(curve, args.sag_tol, dtype=mesh_dtype(args),
+                                      tangents=tangents)
+    return revolve_curve(curve, args.n_ang, watertight=not args.open_ends,
+                         dtype=mesh_dtype(args), tangents=tangents)
+
+
+def print_lens_data(params, intersection_point):
+    print(f'Intersection point at (z,r) = {intersection_point}')
+    print(f'===== Lens Data =====')
+    if 'z0' in params:
+        print(f'Object and image positions z0 = {params["z0"]} cm, zi = {params["z2"]} cm')
+    print(f'width = {params["t"]} cm')
+    print(f'diameter = {2 * intersection_point[1]} cm')
+
+
+# ===============
+#   SUBCOMANDOS
+# ===============
+
+def cmd_generate(args):
+    params = load_params(args)
+    resolve_discretization(args, params)
+    lens = build_lens(args, params)
+    print_lens_data(params, lens.intersection_point)
+
+
+def cmd_export(args):
+    params = load_params(args)
+    resolve_discretization(args, params)
+
+    # Con caché solo se usa la discretización uniforme (sin normales)
+    normals = None
+    if args.cache_dir is not None and not args.stream and not args.normals \
+            and args.sag_tol is None and args.chord_tol is None:
+        from cache import MeshCache, lens_mesh
+        mesh = lens_mesh(params, args.n_rho, args.n_ang,
+                         watertight=not args.open_ends,
+                         cache=MeshCache(args.cache_dir), dtype=mesh_dtype(args))
+        print_lens_data(params, tuple(mesh['intersection'][2:]))
+        vertices, faces = mesh['vertices'], mesh['faces']
+    else:
+        lens = build_lens(args, params)
+        print_lens_data(params, lens.intersection_point)
+        if args.stream:
+            tangents = lens.get_tangents() if args.normals else None
+            export_mesh(args.output, RevolvedMesh(lens.get_points(), args.n_ang,
+                                                  dtype=mesh_dtype(args), tangents=tangents,
+                                                  watertight=not args.open_ends))
+            return
+        vertices, faces, *normals = build_mesh(args, lens, normals=args.normals)
+        normals = normals[0] if normals else None
+
+    kwargs = {'binary': not args.ascii} if args.output.lower().endswith('.stl') else {}
+    export_mesh(args.output, vertices, faces, normals=normals, **kwargs)
+
+
+def cmd_sweep(args):
+    from sweep import expand_grid, run_sweep
+
+    if args.list is not None:
+        with open(args.list, "r") as f:
+            param_sets = json.load(f)
+    else:
+        axes = {}
+        for spec in args.grid:
+            key, _, values = spec.partition('=')
+            axes[key] = [float(v) for v in values.split(',')]
+        param_sets = expand_grid(load_params(args), **axes)
+
+    results = run_sweep(param_sets, args.n_rho, args.n_ang, out_dir=args.out_dir,
+                        workers=args.workers, binary=not args.ascii,
+                        cache_dir=args.cache_dir, dtype=mesh_dtype(args),
+                        watertight=not args.open_ends)
+
+    failed = [res for res in results if res['error']]
+    print(f"{len(results) - len(failed)} lentes generadas en {args.out_dir}, "
+          f"{len(failed)} con error")
+
+
+def cmd_trace(args):
+    from raytrace import trace_lens
+
+    params = load_params(args)
+    resolve_discretization(args, params)
+    lens = build_lens(args, params)
+    print_lens_data(params, lens.intersection_point)
+
+    res = trace_lens(lens, args.rays, fill=args.fill,
+                     mesh=args.n_ang if args.mesh else None)
+    print(f'===== Ray trace ({"mesh" if args.mesh else "exact"}) =====')
+    print(f'rays = {res["n_traced"]} ({res["vignetted"]} vignetted)')
+    print(f'spot at z = {res["z_image"]} cm: RMS {res["spot_rms_um"]:.4g} µm, '
+          f'max {res["spot_max_um"]:.4g} µm')
+    print(f'best focus z = {res["best_focus_z"]:.9g} cm: RMS {res["best_focus_rms_um"]:.4g} µm')
+    print(f'wavefront error: RMS {res["wfe_rms_um"]:.4g} µm '
+          f'({res["wfe_rms_waves"]:.4g} waves), PV {res["wfe_pv_um"]:.4g} µm')
+
+
+def cmd_tolerance(args):
+    from tolerance import analyze_tolerances, parse_sigma, print_report, summary
+
+    params = load_params(args)
+    res = analyze_tolerances(params, args.samples, parse_sigma(args.sigma),
+                             diameter_tol=args.diameter_tol,
+                             spot_tol_um=args.spot_tol_um, focus_tol=args.focus_tol,
+                             shape_tol_um=args.shape_tol_um, n_rays=args.rays,
+                             seed=args.seed, workers=args.workers)
+    print_lens_data(params, res['nominal_intersection'])
+    print_report(res)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(summary(res), f, indent=2)
+
+
+def cmd_design(args):
+    from design import solve_design, parse_targets
+
+    params = load_params(args)
+    res = solve_design(params, parse_targets(args.target), args.free,
+                       edge_radius=args.edge_radius)
+    print_lens_data(res['params'], res['intersection_point'])
+    for key in args.free:
+        print(f'{key} = {res["params"][key]!r}')
+    print(f'({res["iterations"]} iterations)')
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(res['params'], f, indent=4)
+
+
+def cmd_view(args):
+    from viewer import show_vispy, info_view
+
+    params = load_params(args)
+    resolve_discretization(args, params)
+    lens = build_lens(args, params)
+    print_lens_data(params, lens.intersection_point)
+    intersection_point = lens.intersection_point
+
+    if not args.no_3d:
+        vertices, faces, *normals = build_mesh(args, lens, normals=args.normals)
+        show_vispy(vertices, faces, SHOW_WIREFRAME=True,
+                   normals=normals[0] if normals else None)
+
+    if not args.no_2d:
+        info_view(
+            lens.s1.get_points(),
+            lens.s2.get_points(),
+            lens.get_points(),
+            intersection_point,
+            width=params['t'],
+            diameter=2*intersection_point[1]
+        )
+
+
+def cmd_cache(args):
+    from cache import MeshCache
+
+    cache = MeshCache(args.cache_dir)
+    if args.action == "info":
+        entries = cache.entries()
+        total = sum(size for _, size, _ in entries)
+        print(f"{cache.root}: {len(entries)} entradas, {total / 1024**2:.1f} MB")
+    else:
+        n = cache.invalidate(args.key)
+        print(f"Entradas borradas: {n}")
+
+def make_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--params", "-p", default=FILE_NAME,
+                        help="Ruta al archivo JSON con los parámetros "
+                             "(físicos, o sigma1/sigma2 con G, O, T, S)")
+    for key in OPTICAL_KEYS:
+        common.add_argument(f"--{key}", type=float, default=None,
+                            help=f"Sobrescribe {key} del archivo de parámetros")
+    common.add_argument("--n-rho", type=int, default=N_RHO,
+                        help="Número de puntos de cada curva sigma")
+    common.add_argument("--n-ang", type=int, default=N_ANG,
+                        help="Resolución angular (n_phi = 2·n_ang)")
+    common.add_argument("--tol-um", type=float, default=None,
+                        help="Elige N_RHO y N_ANG mínimos para esta desviación "
+                             "máxima de la malla (µm)")
+    common.add_argument("--chord-tol", type=float, default=None,
+                        help="Muestreo adaptativo del perfil con esta tolerancia (cm)")
+    common.add_argument("--sag-tol", type=float, default=None,
+                        help="Resolución azimutal adaptativa con esta flecha máxima (cm)")
+    common.add_argument("--open-ends", action="store_true",
+                        help="No cerrar la malla en el eje (anillos completos en los polos)")
+    common.add_argument("--float32", action="store_true",
+                        help="Vértices en float32 (el perfil se sigue calculando en float64)")
+    common.add_argument("--normals", action="store_true",
+                        help="Normales analíticas por vértice (PLY y OBJ; "
+                             "sombreado suave en view)")
+    common.add_argument("--cache-dir", default=None,
+                        help="Directorio de la caché de mallas")
+    common.add_argument("--profile", default=None, metavar="FILE",
+                        help="Guarda tiempos, llamadas y memoria por etapa en FILE (JSON)")
+    common.add_argument("--trace", default=None, metavar="FILE",
+                        help="Guarda las etapas en FILE en formato Chrome trace")
+
+    parser = argparse.ArgumentParser(
+        description="Genera lentes Ω formadas por superficies cartesianas")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("generate", parents=[common],
+                       help="Calcula la lente y muestra sus datos")
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser("export", parents=[common], help="Exporta la malla de la lente")
+    p.add_argument("--output", "-o", default="surface.stl",
+                   help="Archivo de salida; el formato sale de la extensión "
+                        "(.stl, .ply, .obj, .3mf)")
+    p.add_argument("--ascii", action="store_true", help="STL en ASCII en vez de binario")
+    p.add_argument("--stream", action="store_true",
+                   help="Escribe la malla por bloques de anillos sin construirla "
+                        "completa (no admite --sag-tol ni --ascii)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("sweep", parents=[common],
+                       help="Genera muchas lentes en paralelo")
+    p.add_argument("--grid", "-g", action="append", default=[],
+                   help="Eje del barrido, p.ej. t=3,4,5 (se puede repetir)")
+    p.add_argument("--list", default=None,
+                   help="JSON con una lista de conjuntos de parámetros")
+    p.add_argument("--out-dir", "-o", default="sweep_output",
+                   help="Directorio de salida")
+    p.add_argument("--workers", "-j", type=int, default=None,
+                   help="Número de procesos")
+    p.add_argument("--ascii", action="store_true", help="STL en ASCII en vez de binario")
+    p.set_defaults(func=cmd_sweep)
+
+    p = sub.add_parser("trace", parents=[common],
+                       help="Traza rayos y mide el estigmatismo de la lente")
+    p.add_argument("--rays", type=int, default=100_000, help="Número de rayos")
+    p.add_argument("--mesh", action="store_true",
+                   help="Trazar contra la malla (n_rho, n_ang) en vez de las superficies exactas")
+    p.add_argument("--fill", type=float, default=0.95,
+                   help="Fracción del radio de la lente cubierta por la pupila")
+    p.set_defaults(func=cmd_trace)
+
+    p = sub.add_parser("tolerance", parents=[common],
+                       help="Análisis de tolerancias por Monte Carlo")
+    p.add_argument("--samples", "-n", type=int, default=5000, help="Número de lentes")
+    p.add_argument("--sigma", action="append", default=[],
+                   help="Desviación estándar de t, n1, z1 o z2, p.ej. t=0.02 "
+                        "(se puede repetir)")
+    p.add_argument("--diameter-tol", type=float, default=None,
+                   help="Error máximo del diámetro (cm)")
+    p.add_argument("--spot-tol-um", type=float, default=None,
+                   help="Radio RMS máximo de la mancha en el plano imagen (µm)")
+    p.add_argument("--focus-tol", type=float, default=None,
+                   help="Desplazamiento máximo del mejor foco (cm)")
+    p.add_argument("--shape-tol-um", type=float, default=None,
+                   help="Desviación máxima del perfil respecto al nominal (µm)")
+    p.add_argument("--rays", type=int, default=256, help="Rayos por lente")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--workers", "-j", type=int, default=None,
+                   help="Número de procesos")
+    p.add_argument("--out", default=None, help="Guarda el resumen en este JSON")
+    p.set_defaults(func=cmd_tolerance)
+
+    p = sub.add_parser("design", parents=[common],
+                       help="Resuelve z1, z2 o t para un diámetro o espesor dados")
+    p.add_argument("--target", "-T", action="append", required=True,
+                   help="Objetivo en cm: diameter=25, edge_thickness=1.5 o "
+                        "center_thickness=4 (se puede repetir)")
+    p.add_argument("--free", "-f", action="append", required=True,
+                   choices=("z1", "z2", "t"), help="Parámetro libre (se puede repetir)")
+    p.add_argument("--edge-radius", type=float, default=None,
+                   help="Distancia al eje a la que se mide edge_thickness (cm)")
+    p.add_argument("--save", default=None, metavar="FILE",
+                   help="Guarda los parámetros resueltos en FILE (JSON)")
+    p.set_defaults(func=cmd_design)
+
+    p = sub.add_parser("view", parents=[common], help="Vista 3D (vispy) y 2D (matplotlib)")
+    p.add_argument("--no-3d", action="store_true", help="No mostrar la vista 3D")
+    p.add_argument("--no-2d", action="store_true", help="No mostrar la vista 2D")
+    p.set_defaults(func=cmd_view)
+
+    p = sub.add_parser("cache", help="Tamaño de la caché de mallas o borrado de entradas")
+    p.add_argument("action", choices=("info", "invalidate"))
+    p.add_argument("key", nargs="?", help="Entrada a borrar (por defecto, todas)")
+    p.add_argument("--cache-dir", default=None,
+                   help="Directorio de la caché de mallas")
+    p.set_defaults(func=cmd_cache, profile=None, trace=None)
+
+    return parser
+
+
+def main(argv=None):
+    parser = make_parser()
+    argv = sys.argv[1:] if argv is None else argv
+    # Sin subcomando se comporta como antes: muestra la lente
+    if not argv or argv[0].startswith('-') and argv[0] not in ('-h', '--help'):
+        argv = ['view', *argv]
+    args = parser.parse_args(argv)
+
+    # RevolvedMesh solo genera la resolución azimutal uniforme
+    if getattr(args, 'stream', False) and (args.sag_tol is not None or args.ascii):
+        parser.error("--stream no admite --sag-tol ni --ascii")
+
+    # El barrido usa la malla uniforme de lens_mesh con N_RHO y N_ANG fijos
+    if args.func is cmd_sweep:
+        for flag, value in (('--normals', args.normals), ('--sag-tol', args.sag_tol),
+                            ('--chord-tol', args.chord_tol), ('--tol-um', args.tol_um)):
+            if value not in (None, False):
+                parser.error(f"sweep no admite {flag}")
+
+    if args.profile or args.trace:
+        PROFILER.enable()
+    args.func(args)
+    if args.profile:
+        PROFILER.write_json(args.profile)
+    if args.trace:
+        PROFILER.write_chrome_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
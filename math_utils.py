@@ -1,5 +1,7 @@
 import numpy as np
 
+from profiling import count
+
 def biseccion(f, a, b, tol=1e-6, max_iter=100):
     """Bisection Method for find roots of the function f in the interval [a, b]"""
     fa, fb = f(a), f(b)
@@ -45,47 +47,254 @@ def biseccion_mod(f, a, b, tol=1e-9, max_iter=100):
     return c
 
 
-def newton_raphson_2d(F, x0, tol=1e-10, max_iter=50):
+def adaptive_samples(f, a, b, chord_tol, angle_tol=None, n_init=9,
+                     max_points=100_000):
+    """
+    Muestreo adaptativo del parámetro de una curva plana.
+
+    Parameters:
+        f          : function s -> (x(s), y(s)), vectorized over arrays
+        a, b       : parameter interval
+        chord_tol  : maximum distance between the curve and each chord
+        angle_tol  : optional maximum turning angle (rad) between chords
+        n_init     : number of uniform samples to start with
+        max_points : hard limit on the number of samples
+
+    Returns:
+        sorted array of parameters s
+    """
+    s = np.linspace(a, b, n_init)
+    x, y = f(s)
+
+    while len(s) < max_points:
+        sm = 0.5 * (s[:-1] + s[1:])
+        xm, ym = f(sm)
+
+        # Distancia del punto medio a la cuerda
+        dx, dy = np.diff(x), np.diff(y)
+        length = np.hypot(dx, dy)
+        dev = np.abs(dx * (ym - y[:-1]) - dy * (xm - x[:-1]))
+        refine = dev > chord_tol * np.maximum(length, np.finfo(float).tiny)
+
+        if angle_tol is not None and len(s) > 2:
+            turn = np.abs(np.angle(np.exp(1j * np.diff(np.arctan2(dy, dx)))))
+            bend = turn > angle_tol
+            refine[:-1] |= bend
+            refine[1:] |= bend
+
+        if not refine.any():
+            break
+
+        idx = np.flatnonzero(refine)[:max_points - len(s)]
+        s = np.insert(s, idx + 1, sm[idx])
+        x = np.insert(x, idx + 1, xm[idx])
+        y = np.insert(y, idx + 1, ym[idx])
+
+    return s
+
+
+def newton_raphson_2d(F, x0, tol=1e-10, max_iter=50, jac=None,
+                      full_output=False):
     """
     Multivariable Newton–Raphson for solving F(x) = 0 in R^2.
 
     Parameters:
-        F        : function R^2 -> R^2, returns (f1, f2)
-        x0       : tuple (s1, s2) initial guess
-        tol      : convergence tolerance
-        max_iter : maximum number of iterations
+        F           : function R^2 -> R^2, returns (f1, f2)
+        x0          : tuple (s1, s2) initial guess
+        tol         : convergence tolerance
+        max_iter    : maximum number of iterations
+        jac         : None for a forward-difference Jacobian, a function
+                      returning the 2x2 Jacobian, or True if F returns
+                      ((f1, f2), J)
+        full_output : also return a dict with 'iterations', 'residual'
+                      and 'nfev' (number of F evaluations)
 
     Returns:
-        (s1, s2) solution
+        (s1, s2) solution, or ((s1, s2), info) if full_output
     """
     x = np.array(x0, dtype=float)
-    
-    def jacobian(F, x, h=1e-8):
+    nfev = 0
+
+    def jacobian(F, x, f0, h=1e-8):
         """Numerical Jacobian via finite differences."""
+        nonlocal nfev
         J = np.zeros((2, 2))
-        f0 = np.array(F(*x))
         for i in range(2):
             x_step = x.copy()
             x_step[i] += h
             fi = np.array(F(*x_step))
+            nfev += 1
+            count('newton_raphson_2d.residuals')
             J[:, i] = (fi - f0) / h
         return J
 
-    for _ in range(max_iter):
+    def evaluate(x):
+        nonlocal nfev
+        nfev += 1
+        count('newton_raphson_2d.residuals')
+        if jac is True:
+            f_val, J = F(*x)
+            return np.array(f_val), np.array(J)
         f_val = np.array(F(*x))
+        if jac is None:
+            return f_val, None
+        return f_val, np.array(jac(*x))
+
+    def done(x, f_val, it):
+        if full_output:
+            info = {'iterations': it, 'residual': float(np.linalg.norm(f_val)),
+                    'nfev': nfev}
+            return tuple(x), info
+        return tuple(x)
+
+    for it in range(max_iter):
+        f_val, J = evaluate(x)
         if np.linalg.norm(f_val, ord=2) < tol:
-            return tuple(x)
-        J = jacobian(F, x)
+            return done(x, f_val, it)
+        count('newton_raphson_2d.iterations')
+        if J is None:
+            J = jacobian(F, x, f_val)
         try:
             delta = np.linalg.solve(J, -f_val)
         except np.linalg.LinAlgError:
             raise ValueError(f"Jacobian is singular at {x}")
         x += delta
         if np.linalg.norm(delta, ord=2) < tol:
-            return tuple(x)
+            if full_output:
+                f_val = evaluate(x)[0]
+            return done(x, f_val, it + 1)
 
     raise RuntimeError("Newton–Raphson did not converge.")
 
+def newton_raphson_2d_batch(FJ, x0, tol=1e-10, max_iter=50):
+    """
+    Vectorized Newton–Raphson for many independent 2x2 systems.
+
+    When a step lands where the residual is not finite (e.g. beyond the rim
+    of a sigma curve) that step is halved and retried.
+
+    Parameters:
+        FJ       : function (s1, s2, idx) -> ((f1, f2), ((J11, J12), (J21, J22)))
+                   evaluated over the arrays s1, s2 of the systems idx
+        x0       : tuple (s1, s2) of initial guesses (arrays, same shape)
+        tol      : convergence tolerance
+        max_iter : maximum number of iterations
+
+    Returns:
+        s1, s2, converged mask, iterations per system
+    """
+    s1 = np.array(x0[0], dtype=float)
+    s2 = np.array(x0[1], dtype=float)
+    converged = np.zeros(s1.shape, dtype=bool)
+    iterations = np.zeros(s1.shape, dtype=int)
+    active = np.ones(s1.shape, dtype=bool)
+    # Último paso de cada sistema, para retroceder si sale del dominio
+    last1 = np.zeros(s1.shape)
+    last2 = np.zeros(s1.shape)
+
+    for _ in range(max_iter):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        (f1, f2), ((a, b), (c, d)) = FJ(s1[idx], s2[idx], idx)
+
+        # Residuo no finito: se reduce a la mitad el último paso
+        bad = ~np.isfinite(f1 + f2 + a + b + c + d)
+        back = idx[bad & (np.abs(last1[idx]) + np.abs(last2[idx]) > tol)]
+        last1[back] *= 0.5
+        last2[back] *= 0.5
+        s1[back] -= last1[back]
+        s2[back] -= last2[back]
+
+        ok = ~bad & (np.abs(f1) + np.abs(f2) < tol)
+        converged[idx[ok]] = True
+
+        # Regla de Cramer para el sistema J·δ = -f
+        det = a*d - b*c
+        d1 = (-f1*d + f2*b) / det
+        d2 = (-f2*a + f1*c) / det
+        step = ~bad & ~ok & np.isfinite(d1) & np.isfinite(d2)
+        s1[idx[step]] += d1[step]
+        s2[idx[step]] += d2[step]
+        last1[idx[step]] = d1[step]
+        last2[idx[step]] = d2[step]
+        iterations[idx[step]] += 1
+
+        small = step & (np.hypot(d1, d2) < tol)
+        converged[idx[small]] = True
+
+        # Se abandonan los sistemas convergidos o sin paso posible
+        stop = ok | small | (~step & ~np.isin(idx, back))
+        active[idx[stop]] = False
+
+    return s1, s2, converged, iterations
+
+
+def biseccion_batch(f, a, b, tol=1e-12, max_iter=200):
+    """
+    Vectorized bisection over arrays of brackets [a, b] where f changes sign.
+    f must be vectorized and element-wise.
+    """
+    a = np.array(a, dtype=float)
+    b = np.array(b, dtype=float)
+    fa = f(a)
+
+    for _ in range(max_iter):
+        c = 0.5 * (a + b)
+        fc = f(c)
+        left = np.sign(fc) != np.sign(fa)
+        b = np.where(left, c, b)
+        a = np.where(left, a, c)
+        fa = np.where(left, fa, fc)
+        if np.all(b - a < tol):
+            break
+
+    return 0.5 * (a + b)
+
+
+def newton_bisection_batch(fjet, a, b, tol=1e-12, max_iter=100):
+    """
+    Safeguarded Newton/bisection hybrid over arrays of brackets.
+
+    Parameters:
+        fjet     : function x -> (f(x), f'(x)), vectorized and element-wise
+        a, b     : brackets with f(a) > 0 and f(b) <= 0 (or not finite)
+        tol      : tolerance on the bracket width and on the Newton step
+                   (relative for |x| > 1)
+        max_iter : maximum number of iterations
+
+    A Newton step is taken when it stays inside the current bracket,
+    otherwise the bracket is bisected.
+
+    Returns:
+        array of roots
+    """
+    a = np.array(a, dtype=float)
+    b = np.array(b, dtype=float)
+    x = 0.5 * (a + b)
+
+    for _ in range(max_iter):
+        fx, dfx = fjet(x)
+        inside = fx > 0
+        a = np.where(inside, x, a)
+        b = np.where(inside, b, x)
+        if np.all(b - a < tol):
+            break
+
+        with np.errstate(all='ignore'):
+            dx = fx / dfx
+        xn = x - dx
+        ok = np.isfinite(fx) & (xn > a) & (xn < b)
+
+        # Paso de Newton por debajo de tol (relativa): raíz encontrada
+        done = np.isfinite(dx) & (np.abs(dx) <= tol * np.maximum(1.0, np.abs(x)))
+        x = np.where(ok | done, xn, 0.5 * (a + b))
+        a = np.where(done, x, a)
+        b = np.where(done, x, b)
+
+    return 0.5 * (a + b)
+
+
 def intersection_between_curves(x1, y1, x2, y2, s1_0, s2_0):
     """
     Finds intersection between two parametric curves:
@@ -109,3 +318,22 @@ def intersection_between_curves(x1, y1, x2, y2, s1_0, s2_0):
     return newton_raphson_2d(F, (s1_0, s2_0))
 
 
+def intersection_between_jets(j1, j2, s1_0, s2_0, tol=1e-10, max_iter=50,
+                              full_output=False):
+    """
+    Intersection of two parametric curves with an exact Jacobian.
+
+    Each curve is a function s -> (x, y, dx/ds, dy/ds).
+
+    Returns:
+        (s1, s2) intersection parameters, or ((s1, s2), info) if full_output
+    """
+    def FJ(s1, s2):
+        x1, y1, dx1, dy1 = j1(s1)
+        x2, y2, dx2, dy2 = j2(s2)
+        J = ((dx1, -dx2),
+             (dy1, -dy2))
+        return (x1 - x2, y1 - y2), J
+
+    return newton_raphson_2d(FJ, (s1_0, s2_0), tol=tol, max_iter=max_iter,
+                             jac=True, full_output=full_output)
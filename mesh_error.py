@@ -0,0 +1,173 @@
+# mesh_error.py
+
+# Error de discretización: desviación máxima entre la malla triangulada y
+# las superficies cartesianas exactas, y selección automática de N_RHO y
+# N_ANG para una tolerancia dada en micras.
+#
+#   python main.py generate --tol-um 1.0              # N_RHO, N_ANG para 1 µm
+#   python main.py export --tol-um 1.0 -p lente.json
+
+import math
+
+import numpy as np
+
+from singlet import OmegaLens
+from surface_generation import RevolvedMesh, revolve_curve
+
+# Unidades de la curva (cm) por micra
+UM = 1e-4
+
+
+def barycentric_samples(order):
+    """Pesos baricéntricos de una rejilla de orden order sobre el triángulo (m x 3)."""
+    i, j = np.meshgrid(np.arange(order + 1), np.arange(order + 1), indexing='ij')
+    keep = i + j <= order
+    i, j = i[keep], j[keep]
+    return np.column_stack((i, j, order - i - j)) / order
+
+
+def profile_distance(lens, z, r):
+    """
+    Distancia de los puntos (z, r) del plano meridiano al perfil exacto de
+    la lente (Σ₁ hasta ρ₁ y Σ₂ hasta ρ₂ de la intersección).
+
+    Cada punto se compara con el punto de cada sigma a su misma distancia
+    ρ del vértice; se elige la sigma más cercana y la distancia es la del
+    punto a su recta tangente allí (fuera del tramo, al extremo).
+    """
+    z = np.asarray(z, dtype=float)
+    r = np.asarray(r, dtype=float)
+    best = np.full(z.shape, np.inf)
+    dist = np.full(z.shape, np.inf)
+
+    for f, rho_i in zip((lens.s1.compiled, lens.s2.compiled), lens.rho_intersection):
+        rho = np.hypot(z - f.t_shift, r)
+        outside = rho > rho_i
+        qz, qr, dz, dr = f.zr_jet(np.clip(rho, 1e-9, rho_i))
+        ez, er = z - qz, r - qr
+        chord = np.hypot(ez, er)
+        line = np.abs(ez*dr - er*dz) / np.hypot(dz, dr)
+        d = np.where(outside, chord, np.minimum(line, chord))
+
+        closer = chord < best
+        best = np.where(closer, chord, best)
+        dist = np.where(closer, d, dist)
+
+    return dist
+
+
+def profile_deviation(lens, order=8):
+    """Desviación máxima del perfil poligonal de la lente respecto al exacto."""
+    pts = lens.get_points()
+    t = np.arange(1, order) / order
+    seg = pts[:-1, None, :] + t[None, :, None] * np.diff(pts, axis=0)[:, None, :]
+    return float(np.nanmax(profile_distance(lens, seg[..., 0], seg[..., 1])))
+
+
+def mesh_deviation(lens, vertices, faces=None, order=4, chunk=100_000):
+    """
+    Desviación máxima (cm) entre la malla y la superficie exacta de lens,
+    evaluada en una rejilla baricéntrica de orden order dentro de cada
+    triángulo (con order par incluye los puntos medios de las aristas).
+
+    vertices puede ser un RevolvedMesh (sin faces): se recorre por bandas
+    sin materializar la malla.
+    """
+    w = barycentric_samples(order)
+
+    if isinstance(vertices, RevolvedMesh):
+        rows = max(1, chunk // (2*vertices.n_phi))
+        blocks = vertices.iter_bands(rows)
+    else:
+        vertices = np.asarray(vertices)
+        blocks = ((vertices, faces[i:i + chunk]) for i in range(0, len(faces), chunk))
+
+    worst = 0.0
+    for verts, block in blocks:
+        tri = np.asarray(verts, dtype=float)[block]           # (n, 3, 3)
+        p = np.einsum('mk,nkc->nmc', w, tri)                 # (n, m, 3)
+        d = profile_distance(lens, p[..., 2], np.hypot(p[..., 0], p[..., 1]))
+        if d.size:
+            worst = max(worst, float(np.nanmax(d)))
+    return worst
+
+
+def n_ang_for(r_max, tol):
+    """Mínimo n_ang con flecha azimutal r_max·(1 - cos(π/n_phi)) <= tol."""
+    if tol >= r_max:
+        return 2
+    n_phi = math.pi / math.acos(1 - tol / r_max)
+    return max(2, math.ceil(n_phi / 2))
+
+
+def n_rho_for(params, tol, n_min=4, n_max=1_000_000, **curve_kw):
+    """
+    Mínimo N_RHO cuyo perfil poligonal se desvía menos de tol del exacto:
+    se duplica hasta cumplir y luego se bisecta.
+    """
+    def ok(n):
+        return profile_deviation(OmegaLens.from_params(params, n, **curve_kw)) <= tol
+
+    hi = n_min
+    while not ok(hi):
+        if hi >= n_max:
+            raise RuntimeError(f"N_RHO > {n_max} para una tolerancia de {tol} cm")
+        hi = min(2*hi, n_max)
+    lo = max(n_min, hi // 2)
+    if lo == hi or ok(lo):
+        return lo
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        lo, hi = (lo, mid) if ok(mid) else (mid, hi)
+    return hi
+
+
+def auto_discretization(params, tol_um, watertight=True, verify=True, order=4,
+                        max_rounds=5):
+    """
+    Discretización uniforme (N_RHO, N_ANG) más barata cuya malla se desvía
+    menos de tol_um micras de la lente exacta.
+
+    Los errores del perfil (~1/N_RHO²) y azimutal (~1/N_ANG²) se suman en el
+    peor caso; el producto N_RHO·N_ANG (número de triángulos) es mínimo
+    repartiendo la tolerancia a partes iguales. Con verify se mide la malla
+    resultante con mesh_deviation: si no cumple se refinan ambos y si sobra
+    margen se prueba una malla más gruesa.
+
+    Retorna un dict con 'n_rho', 'n_ang', 'error_um' (medido, o None sin
+    verify) y 'n_faces'.
+    """
+    tol = tol_um * UM
+    n_rho = n_rho_for(params, tol / 2)
+    r_max = float(np.max(OmegaLens.from_params(params, n_rho).get_points()[:, 1]))
+    n_ang = n_ang_for(r_max, tol / 2)
+
+    def measure(n_rho, n_ang):
+        lens = OmegaLens.from_params(params, n_rho)
+        vertices, faces = revolve_curve(lens.get_points(), n_ang, watertight=watertight)
+        return mesh_deviation(lens, vertices, faces, order=order), len(faces)
+
+    if not verify:
+        # Número de caras de la malla uniforme (cota superior)
+        return {'n_rho': n_rho, 'n_ang': n_ang, 'n_faces': 2*(2*n_rho - 1)*2*n_ang,
+                'error_um': None}
+
+    error, n_faces = measure(n_rho, n_ang)
+    for _ in range(max_rounds):
+        if error <= tol:
+            break
+        scale = math.sqrt(error / tol) * 1.05
+        n_rho = math.ceil(n_rho * scale)
+        n_ang = math.ceil(n_ang * scale)
+        error, n_faces = measure(n_rho, n_ang)
+
+    # El reparto supone el peor caso (errores sumados): si sobra margen se
+    # prueba una sola vez una malla más gruesa, escalada con el error medido
+    if error < 0.9*tol:
+        scale = math.sqrt(error / tol) * 1.02
+        coarse = (max(4, math.ceil(n_rho * scale)), max(2, math.ceil(n_ang * scale)))
+        c_error, c_faces = measure(*coarse)
+        if c_error <= tol:
+            (n_rho, n_ang), error, n_faces = coarse, c_error, c_faces
+
+    return {'n_rho': n_rho, 'n_ang': n_ang, 'n_faces': n_faces, 'error_um': error / UM}
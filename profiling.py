@@ -0,0 +1,115 @@
+# profiling.py
+
+# Instrumentación por etapas del pipeline: tiempo, llamadas, contadores y
+# pico de memoria. Desactivada por defecto; con PROFILER.enable() (o las
+# opciones --profile/--trace de main.py) se registra cada etapa.
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.track_memory = False
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+        self.events = []
+        self._stack = []
+        self._t0 = time.perf_counter()
+
+    def enable(self, track_memory=True):
+        self.reset()
+        self.enabled = True
+        self.track_memory = track_memory
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+        if self.track_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        if self.track_memory:
+            # El pico de la etapa externa se guarda antes de reiniciarlo
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][2] = max(self._stack[-1][2], peak - self._stack[-1][3])
+            tracemalloc.reset_peak()
+        else:
+            current = 0
+        frame = [name, time.perf_counter(), 0, current]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._stack.pop()
+            peak = frame[2]
+            if self.track_memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - frame[3])
+                if self._stack:
+                    self._stack[-1][2] = max(self._stack[-1][2],
+                                             peak + frame[3] - self._stack[-1][3])
+                tracemalloc.reset_peak()
+
+            st = self.stages.setdefault(name, {'calls': 0, 'time': 0.0, 'peak_bytes': 0})
+            st['calls'] += 1
+            st['time'] += end - frame[1]
+            st['peak_bytes'] = max(st['peak_bytes'], peak)
+            self.events.append((name, frame[1] - self._t0, end - frame[1]))
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self):
+        return {'stages': self.stages, 'counters': self.counters}
+
+    def write_json(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def write_chrome_trace(self, filename):
+        """Formato Trace Event (chrome://tracing, Perfetto)."""
+        pid, tid = os.getpid(), threading.get_ident()
+        events = [{'name': name, 'ph': 'X', 'ts': start*1e6, 'dur': dur*1e6,
+                   'pid': pid, 'tid': tid}
+                  for name, start, dur in self.events]
+        events += [{'name': name, 'ph': 'C', 'ts': 0, 'pid': pid,
+                    'args': {'value': value}}
+                   for name, value in self.counters.items()]
+        with open(filename, "w") as f:
+            json.dump({'traceEvents': events}, f)
+
+
+PROFILER = Profiler()
+stage = PROFILER.stage
+count = PROFILER.count
+
+
+def profiled(name):
+    """Decorador: registra cada llamada a la función como la etapa name."""
+    def deco(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with PROFILER.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return deco
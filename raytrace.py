@@ -0,0 +1,321 @@
+# raytrace.py
+
+# Trazado de rayos secuencial y vectorizado para validar el estigmatismo de
+# una lente Ω: los rayos salen del punto objeto, se refractan (ley de Snell)
+# en Σ₁ y en Σ₂ y se mide la mancha en el plano imagen y el error de frente
+# de onda. Las superficies pueden ser las exactas (sigma) o la malla
+# triangulada de revolve_curve.
+
+import math
+
+import numpy as np
+
+from mesh_error import UM
+from profiling import profiled
+
+# Ángulo áureo de la espiral de Vogel
+GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
+
+def sample_pupil(n, radius):
+    """
+    n puntos (x, y) repartidos uniformemente en un disco con una espiral de
+    Vogel: deterministas y sin huecos ni agrupamientos.
+    """
+    i = np.arange(n)
+    rad = radius * np.sqrt((i + 0.5) / n)
+    ang = i * GOLDEN_ANGLE
+    return rad*np.cos(ang), rad*np.sin(ang)
+
+
+def refract(d, normal, eta):
+    """
+    Ley de Snell vectorial: dirección refractada de los rayos unitarios d
+    en una superficie de normal unitaria normal, con eta = n_incidente /
+    n_transmitido (escalar o un valor por rayo). La normal se orienta
+    contra el rayo. Los rayos con reflexión total interna quedan en nan.
+    """
+    eta = np.asarray(eta, dtype=float)
+    cos_i = -np.einsum('ij,ij->i', d, normal)
+    flip = cos_i < 0
+    normal = np.where(flip[:, None], -normal, normal)
+    cos_i = np.abs(cos_i)
+
+    k = 1 - eta**2 * (1 - cos_i**2)
+    with np.errstate(invalid='ignore'):
+        t = eta[..., None]*d + (eta*cos_i - np.sqrt(k))[:, None] * normal
+    return t
+
+
+def intersect_sigma(f, origin, d, rho_max, tol=1e-13, max_iter=50):
+    """
+    Intersección de los rayos origin + s·d con la superficie de revolución
+    de la sigma compilada f (vértice en z = f.t_shift), hasta ρ = rho_max.
+    f puede tener coeficientes en arreglos, uno por rayo (ver
+    compile_lens_batch), y rho_max también.
+
+    Un punto P está sobre la superficie si z(ρ) = P_z con ρ = |P - V|; se
+    resuelve en s con Newton desde el plano del vértice.
+
+    Retorna (puntos, normales unitarias, máscara de rayos válidos).
+    """
+    vz = np.asarray(f.t_shift, dtype=float)
+    per_ray = np.ndim(f.G) > 0 or vz.ndim > 0
+    # Se parte del plano del vértice (s medido desde allí, sin cancelación
+    # con orígenes lejanos)
+    origin = origin + ((vz - origin[:, 2]) / d[:, 2])[:, None]*d
+    s = np.zeros(len(origin))
+    active = np.ones(len(s), dtype=bool)
+
+    for _ in range(max_iter):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        fi = f.take(idx) if per_ray else f
+        p = origin[idx] + s[idx, None]*d[idx]
+        rel = p.copy()
+        rel[:, 2] -= fi.t_shift
+        rho = np.linalg.norm(rel, axis=1)
+        with np.errstate(all='ignore'):
+            z, _, dz, _ = fi.zr_jet(np.maximum(rho, 1e-12))
+            drho = np.einsum('ij,ij->i', rel, d[idx]) / np.maximum(rho, 1e-12)
+            step = (z - p[:, 2]) / (dz*drho - d[idx, 2])
+        step = np.where(np.isfinite(step), step, np.nan)
+        s[idx] -= step
+        active[idx] = np.abs(step) > tol * np.maximum(1.0, np.abs(s[idx]))
+        active[idx[np.isnan(step)]] = False
+
+    p = origin + s[:, None]*d
+    rel = p.copy()
+    rel[:, 2] -= vz
+    rho = np.linalg.norm(rel, axis=1)
+    with np.errstate(all='ignore'):
+        z, r, dz, dr = f.zr_jet(np.maximum(rho, 1e-12))
+    ok = np.isfinite(s) & np.isfinite(dz + dr) & (rho <= rho_max) \
+        & (np.abs(z - p[:, 2]) < 1e-9 * np.maximum(1.0, rho))
+
+    # Normal del meridiano (dr, -dz) llevada al azimut del punto
+    norm = np.hypot(dz, dr)
+    rp = np.hypot(p[:, 0], p[:, 1])
+    with np.errstate(all='ignore'):
+        cos_p = np.where(rp > 0, p[:, 0] / rp, 0.0)
+        sin_p = np.where(rp > 0, p[:, 1] / rp, 0.0)
+    nr = -dz / norm
+    normal = np.column_stack((nr*cos_p, nr*sin_p, dr / norm))
+    return p, normal, ok
+
+
+def intersect_revolved(z, r, n_phi, lo, hi, origin, d, guess, reach=1):
+    """
+    Intersección de los rayos con las caras de la malla de revolución del
+    perfil (z, r) con n_phi pasos azimutales (la de revolve_curve), solo en
+    el tramo de anillos lo..hi.
+
+    guess son los puntos de corte con la superficie exacta: se prueban los
+    triángulos de las celdas a menos de reach anillos y pasos azimutales de
+    la celda de guess (Möller–Trumbore vectorizado).
+
+    Retorna (puntos, normales unitarias de las caras, máscara de rayos válidos).
+    """
+    n = len(origin)
+    zs, rs = z[lo:hi + 1], r[lo:hi + 1]
+    desc = rs[-1] < rs[0]
+    key = -rs if desc else rs
+    gr = np.hypot(guess[:, 0], guess[:, 1])
+    k0 = np.searchsorted(key, -gr if desc else gr) - 1
+    phi = np.mod(np.arctan2(guess[:, 1], guess[:, 0]), 2*np.pi)
+    j0 = np.floor(phi * n_phi / (2*np.pi)).astype(np.int64)
+
+    off = np.arange(-reach, reach + 1)
+    k = np.clip(k0[:, None, None] + off[:, None], 0, len(zs) - 2)       # (n, K, 1)
+    j = (j0[:, None, None] + off) % n_phi                               # (n, 1, J)
+    k, j = np.broadcast_arrays(k, j)
+    k, j = k.reshape(n, -1), j.reshape(n, -1)
+
+    ang = 2*np.pi / n_phi
+    def vertex(kk, jj):
+        return np.stack((rs[kk]*np.cos(jj*ang), rs[kk]*np.sin(jj*ang), zs[kk]), axis=-1)
+
+    a, b = vertex(k, j), vertex(k + 1, j)
+    c, e = vertex(k + 1, (j + 1) % n_phi), vertex(k, (j + 1) % n_phi)
+    # Las dos caras de cada celda, como en generate_mesh_from_vertices_numpy
+    v0 = np.concatenate((a, a), axis=1)
+    v1 = np.concatenate((b, c), axis=1)
+    v2 = np.concatenate((c, e), axis=1)
+
+    e1, e2 = v1 - v0, v2 - v0
+    dd = d[:, None, :]
+    pvec = np.cross(dd, e2)
+    det = np.einsum('nmc,nmc->nm', e1, pvec)
+    with np.errstate(all='ignore'):
+        inv = 1.0 / det
+        tvec = origin[:, None, :] - v0
+        u = np.einsum('nmc,nmc->nm', tvec, pvec) * inv
+        qvec = np.cross(tvec, e1)
+        v = np.einsum('nmc,nmc->nm', dd, qvec) * inv
+        s = np.einsum('nmc,nmc->nm', e2, qvec) * inv
+    eps = 1e-12
+    hit = (np.abs(det) > 1e-300) & (u >= -eps) & (v >= -eps) & (u + v <= 1 + eps) & (s > 1e-12)
+    s = np.where(hit, s, np.inf)
+
+    best = np.argmin(s, axis=1)
+    rows = np.arange(n)
+    sb = s[rows, best]
+    ok = np.isfinite(sb)
+    p = origin + np.where(ok, sb, np.nan)[:, None]*d
+    normal = np.cross(e1[rows, best], e2[rows, best])
+    normal /= np.linalg.norm(normal, axis=1)[:, None]
+    return p, normal, ok
+
+
+def trace_rays(f1, f2, rho1, rho2, origin, d, n0, n1, mesh=None):
+    """
+    Trazado secuencial de los rayos origin + s·d (unitarios) a través de Σ₁
+    (n0 -> n1) y Σ₂ (n1 -> n0), exactas (sigmas compiladas f1, f2 hasta
+    rho1, rho2) o, con mesh = (z, r, n_phi) del perfil, contra la malla
+    uniforme. Las curvas, rho1, rho2 y n1 pueden tener un valor por rayo.
+
+    Retorna (puntos en Σ₁, puntos en Σ₂, direcciones de salida, máscara de
+    rayos que atraviesan la lente).
+    """
+    p1, nrm1, ok1 = intersect_sigma(f1, origin, d, rho1)
+    if mesh is not None:
+        pz, pr, n_phi = mesh
+        m = int(np.argmax(pr))
+        p1, nrm1, ok_m = intersect_revolved(pz, pr, n_phi, 0, m, origin, d, p1)
+        ok1 &= ok_m
+    d1 = refract(d, nrm1, n0 / np.asarray(n1))
+
+    p2, nrm2, ok2 = intersect_sigma(f2, p1, d1, rho2)
+    if mesh is not None:
+        p2, nrm2, ok_m = intersect_revolved(pz, pr, n_phi, m, len(pz) - 1, p1, d1, p2)
+        ok2 &= ok_m
+    d2 = refract(d1, nrm2, np.asarray(n1) / n0)
+
+    ok = ok1 & ok2 & np.isfinite(d2).all(axis=1) & (d2[:, 2] > 0)
+    return p1, p2, d2, ok
+
+
+def pupil_rays(x, y, z_pupil, z_object):
+    """
+    Rayos desde los puntos (x, y) del plano z_pupil hacia +z, en la
+    dirección que viene del objeto sobre el eje en z_object (o que converge
+    hacia él si es virtual, z_object > z_pupil).
+
+    Retorna (orígenes, direcciones unitarias, signo del camino óptico).
+    """
+    side = np.where(np.asarray(z_object) < z_pupil, 1.0, -1.0)
+    origin = np.column_stack((x, y, np.broadcast_to(z_pupil, np.shape(x)).astype(float)))
+    d = origin.copy()
+    d[:, 2] -= z_object
+    d *= np.asarray(side)[..., None]
+    d /= np.linalg.norm(d, axis=1)[:, None]
+    return origin, d, side
+
+
+def lens_conjugates(lens):
+    """(z_objeto, z_imagen, n0, n1) de diseño de una lente por parámetros físicos."""
+    s1, s2 = lens.s1, lens.s2
+    if s1.gots is not None or s2.gots is not None:
+        raise ValueError("lente dada por G, O, T, S: hay que indicar "
+                         "z_object, z_image, n0 y n1")
+    return -s1.z0, s2.zi, s1.n0, s1.ni
+
+
+@profiled("raytrace")
+def trace_lens(lens, n_rays=100_000, z_object=None, z_image=None, n0=None, n1=None,
+               fill=0.95, mesh=None, wavelength_um=0.5876, chunk=None):
+    """
+    Traza n_rays rayos desde el punto objeto (sobre el eje) a través de Σ₁ y
+    Σ₂ de lens hasta el plano imagen.
+
+    Parámetros:
+      z_object, z_image, n0, n1: por defecto los de diseño (-z0, z2, n0, n1)
+      fill:          fracción del radio de la lente que cubre la pupila
+                     (en el plano del vértice de Σ₁)
+      mesh:          None para las superficies exactas, o n_ang para trazar
+                     contra la malla uniforme de revolve_curve(lens.get_points(), n_ang)
+      wavelength_um: longitud de onda para el error de frente de onda en ondas
+      chunk:         rayos por bloque (por defecto 10⁶ exacto, 5·10⁴ malla)
+
+    Retorna un dict con el número de rayos trazados y viñeteados, la mancha
+    en el plano imagen (radio RMS y máximo, µm), el mejor foco (z y radio
+    RMS) y el error de frente de onda (RMS y pico-valle, µm y RMS en ondas)
+    respecto a la esfera de referencia centrada en la imagen.
+    """
+    design = None
+    if None in (z_object, z_image, n0, n1):
+        design = lens_conjugates(lens)
+    z_object = design[0] if z_object is None else z_object
+    z_image = design[1] if z_image is None else z_image
+    n0 = design[2] if n0 is None else n0
+    n1 = design[3] if n1 is None else n1
+
+    f1, f2 = lens.s1.compiled, lens.s2.compiled
+    rho1, rho2 = lens.rho_intersection
+    if chunk is None:
+        chunk = 1_000_000 if mesh is None else 50_000
+    if mesh is not None:
+        prof = lens.get_points()
+        mesh = (prof[:, 0], prof[:, 1], 2*mesh)
+
+    x, y = sample_pupil(n_rays, fill * lens.intersection_point[1])
+    t = f2.t_shift
+    # Esfera de referencia: centrada en la imagen, por el vértice de Σ₂
+    center = np.array([0.0, 0.0, z_image])
+    radius = z_image - t
+    obj = np.array([0.0, 0.0, z_object])
+    opl_chief = n0*(f1.t_shift - z_object) + n1*(t - f1.t_shift)
+
+    spot, slope, wfe = [], [], []
+    for i in range(0, n_rays, chunk):
+        origin, d, side = pupil_rays(x[i:i + chunk], y[i:i + chunk], f1.t_shift, z_object)
+        p1, p2, d2, ok = trace_rays(f1, f2, rho1, rho2, origin, d, n0, n1, mesh)
+        p1, p2, d2 = p1[ok], p2[ok], d2[ok]
+
+        # Corte con el plano imagen
+        u = d2[:, :2] / d2[:, 2:3]
+        spot.append(p2[:, :2] + (z_image - p2[:, 2:3]) * u)
+        slope.append(u)
+
+        # Camino óptico hasta la esfera de referencia
+        rel = p2 - center
+        bq = np.einsum('ij,ij->i', d2, rel)
+        cq = np.einsum('ij,ij->i', rel, rel) - radius**2
+        with np.errstate(invalid='ignore'):
+            root = np.sqrt(bq**2 - cq)
+        s = np.where(np.abs(-bq + root) < np.abs(-bq - root), -bq + root, -bq - root)
+        opl = side*n0*np.linalg.norm(p1 - obj, axis=1) \
+            + n1*np.linalg.norm(p2 - p1, axis=1) + n0*s
+        wfe.append(opl - opl_chief)
+
+    spot = np.concatenate(spot)
+    slope = np.concatenate(slope)
+    wfe = np.concatenate(wfe)
+    n_traced = len(spot)
+    if n_traced == 0:
+        raise RuntimeError("ningún rayo atraviesa la lente")
+
+    centroid = spot.mean(axis=0)
+    rad = np.linalg.norm(spot - centroid, axis=1)
+
+    # Mejor foco: desplazamiento δ que minimiza Σ|x + δ·u|²
+    shift = -np.einsum('ij,ij->', spot, slope) / np.einsum('ij,ij->', slope, slope)
+    best = spot + shift*slope
+    best_rms = np.sqrt(np.mean(np.sum((best - best.mean(axis=0))**2, axis=1)))
+
+    w = wfe - wfe.mean()
+    wfe_rms = np.sqrt(np.mean(w**2))
+    return {
+        'n_rays': n_rays,
+        'n_traced': n_traced,
+        'vignetted': n_rays - n_traced,
+        'z_image': z_image,
+        'spot_rms_um': float(np.sqrt(np.mean(rad**2)) / UM),
+        'spot_max_um': float(rad.max() / UM),
+        'best_focus_z': float(z_image + shift),
+        'best_focus_rms_um': float(best_rms / UM),
+        'wfe_rms_um': float(wfe_rms / UM),
+        'wfe_pv_um': float(np.ptp(w) / UM),
+        'wfe_rms_waves': float(wfe_rms / UM / wavelength_um),
+    }
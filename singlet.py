@@ -4,13 +4,19 @@
 
 from math_utils import * 
 
+import copy
+import math
+from functools import cached_property, lru_cache
+
 import numpy as np 
 import math_utils as mu
+from profiling import profiled, stage
 
 
 # Cartesian Ovioids in the form z = z(ρ), r = r(ρ).
-def sigma(z0, zi, rho, n0, ni): 
-    
+def sigma_coefficients(z0, zi, n0, ni): 
+    """Coeficientes G, O, T, S del óvalo cartesiano."""
+
     z0 = -z0 #Absolutiza los z
 
     G = ((ni**2*zi - n0**2*z0)**2) / (ni*n0*(ni*zi - n0*z0)*(ni*z0 - n0*zi))
@@ -18,6 +24,12 @@ def sigma(z0, zi, rho, n0, ni):
     T = (ni - n0)*(ni + n0)**2 / (4*ni*n0*zi*z0*(ni*zi - n0*z0))
     S = ((ni + n0)*(ni**2*zi - n0**2*z0))/(2*ni*n0*zi*z0*(ni*zi - n0*z0)) 
 
+    return G, O, T, S
+
+
+def sigma_gots(rho, G, O, T, S): 
+    """Curva sigma z(ρ), r(ρ) a partir de los coeficientes G, O, T, S."""
+
     num = (O + T*rho**2)*rho**2
     rad = np.sqrt(1 + (2*S - O**2 * G)*rho**2) 
     den = 1 + S*rho**2 + rad
@@ -25,72 +37,346 @@ def sigma(z0, zi, rho, n0, ni):
     z = num/den 
     r = np.sqrt(rho**2 - z**2) 
 
-
     return z, r
 
 
+def sigma(z0, zi, rho, n0, ni): 
+    return sigma_gots(rho, *sigma_coefficients(z0, zi, n0, ni))
+
+
+def _sqrt(x): 
+    """Raíz escalar que devuelve nan fuera del dominio, como np.sqrt."""
+    return math.sqrt(x) if x >= 0 else math.nan
+
+
+class CompiledSigma: 
+    """
+    Curva sigma con los coeficientes G, O, T, S ya evaluados.
+
+    Evalúa z(ρ) y r(ρ) juntos (z incluye el desplazamiento t_shift). Los
+    escalares se evalúan con math, los arreglos con numpy.
+    """
+
+    def __init__(self, G, O, T, S, t_shift=0.0): 
+        self.G, self.O, self.T, self.S = G, O, T, S
+        self.t_shift = t_shift
+        self.K = 2*S - O**2 * G
+
+    def __call__(self, rho): 
+        return self.zr(rho)
+
+    def zr(self, rho): 
+        if isinstance(rho, (float, int)): 
+            rho2 = rho*rho
+            z = (self.O + self.T*rho2)*rho2 / (1 + self.S*rho2 + _sqrt(1 + self.K*rho2))
+            r = _sqrt(rho2 - z*z)
+            return z + self.t_shift, r
+
+        rho = np.asarray(rho, dtype=float)
+        rho2 = rho*rho
+        z = (self.O + self.T*rho2)*rho2 / (1 + self.S*rho2 + np.sqrt(1 + self.K*rho2))
+        r = np.sqrt(rho2 - z*z)
+        return z + self.t_shift, r
+
+    def zr_jet(self, rho): 
+        """z(ρ), r(ρ) y sus derivadas analíticas dz/dρ, dr/dρ."""
+        G, O, T, S, K = self.G, self.O, self.T, self.S, self.K
+        scalar = isinstance(rho, (float, int))
+        sqrt = _sqrt if scalar else np.sqrt
+        if not scalar: 
+            rho = np.asarray(rho, dtype=float)
+
+        u = rho*rho
+        rad = sqrt(1 + K*u)
+        num = (O + T*u)*u
+        den = 1 + S*u + rad
+        z = num/den
+
+        # d/du de numerador y denominador, con u = ρ²
+        dnum = O + 2*T*u
+        dden = S + K/(2*rad)
+        dz = 2*rho*(dnum*den - num*dden)/(den*den)
+
+        r = sqrt(u - z*z)
+        dr = (rho - z*dz)/r
+
+        return z + self.t_shift, r, dz, dr
+
+    @cached_property
+    def rho_rim(self): 
+        """
+        ρ del borde de la curva (r = 0, es decir ρ² = z²), calculado una sola
+        vez. Funciona igual con coeficientes escalares o en arreglos.
+        """
+        return sigma_rim(self)
+
+    def take(self, idx): 
+        """Subconjunto de una curva con coeficientes en arreglos (ver compile_lens_batch)."""
+        pick = lambda v: v[idx] if np.ndim(v) else v
+        return CompiledSigma(pick(self.G), pick(self.O), pick(self.T),
+                             pick(self.S), pick(self.t_shift))
+
+    def z(self, rho): 
+        return self.zr(rho)[0]
+
+    def r(self, rho): 
+        return self.zr(rho)[1]
+
+
+@profiled("rim")
+def sigma_rim(fn, a=1e-6, b=50.0, tol=1e-12, max_expand=200): 
+    """
+    Radio ρ del borde de una o muchas curvas sigma (ver CompiledSigma.rho_rim).
+
+    Se amplía el intervalo [a, b] por 1.5 hasta que ρ² - z² deja de ser
+    positivo y luego se usa Newton con salvaguarda de bisección, con la
+    derivada analítica 2ρ - 2z·dz/dρ.
+    """
+    def h(rho): 
+        z, _, dz, _ = fn.zr_jet(rho)
+        z = z - fn.t_shift
+        return rho*rho - z*z, 2*rho - 2*z*dz
+
+    shape = np.broadcast(fn.G, fn.O, fn.T, fn.S, fn.t_shift).shape
+    a = np.full(shape, a)
+    b = np.full(shape, b)
+
+    with np.errstate(all='ignore'): 
+        for _ in range(max_expand): 
+            open_ = h(b)[0] > 0
+            if not open_.any(): 
+                break
+            a = np.where(open_, b, a)
+            b = np.where(open_, 1.5*b, b)
+
+        rho = mu.newton_bisection_batch(h, a, b, tol=tol)
+
+    return rho if shape else float(rho)
+
+
+@lru_cache(maxsize=256)
+def compile_sigma(z0, zi, n0, ni, t_shift=0.0): 
+    """
+    CompiledSigma de la curva (z0, zi, n0, ni) desplazada t_shift en z.
+
+    z0 es la distancia del objeto a la izquierda del vértice (objeto en
+    -z0) y zi la posición de la imagen: respecto al vértice desplazado son
+    z0 + t_shift y zi - t_shift.
+    """
+    G, O, T, S = sigma_coefficients(z0 + t_shift, zi - t_shift, n0, ni)
+    return CompiledSigma(G, O, T, S, t_shift)
+
+
+@lru_cache(maxsize=256)
+def compile_gots(G, O, T, S, t_shift=0.0): 
+    """CompiledSigma de una curva dada directamente por G, O, T, S."""
+    return CompiledSigma(G, O, T, S, t_shift)
+
+
 class SigmaCurve: 
-    def __init__(self, z0, zi, n0, ni, rho_points, t_shift=0):
+    # Atributos que definen la curva: replace() solo crea una curva nueva
+    # si cambia alguno
+    FIELDS = ('z0', 'zi', 'n0', 'ni', 'rho_points', 't_shift', 'chord_tol',
+              'angle_tol', 'gots')
+
+    def __init__(self, z0, zi, n0, ni, rho_points, t_shift=0,
+                 chord_tol=None, angle_tol=None, gots=None):
+        # Curva por parámetros físicos (z0, zi, n0, ni) o, si gots no es
+        # None, directamente por los coeficientes (G, O, T, S)
+        self.gots = None if gots is None else tuple(float(c) for c in gots)
         self.z0 = z0
         self.zi = zi 
         self.n0 = n0 
         self.ni = ni 
         self.rho_points = rho_points 
         self.t_shift = t_shift 
-        self.points = self.get_points() 
-        
-    def get_points(self, rhof=None): 
-        z0, zi = self.z0 - self.t_shift, self.zi - self.t_shift 
-        n0, ni = self.n0, self.ni 
+        # Muestreo adaptativo: si chord_tol (cm) está definido se ignora rho_points
+        self.chord_tol = chord_tol 
+        self.angle_tol = angle_tol 
+
+    @cached_property
+    def points(self): 
+        """Curva completa hasta su borde (se calcula al pedirla)."""
+        return self.get_points()
+
+    def replace(self, **changes): 
+        """
+        Curva con los atributos de changes cambiados; la misma curva (con
+        sus puntos y su borde ya calculados) si ninguno cambia de valor.
+        """
+        unknown = set(changes) - set(self.FIELDS)
+        if unknown: 
+            raise TypeError(f"atributos desconocidos: {sorted(unknown)}")
+        if 'gots' in changes and changes['gots'] is not None: 
+            changes['gots'] = tuple(float(c) for c in changes['gots'])
+        if all(getattr(self, k) == v for k, v in changes.items()): 
+            return self
+        kw = {k: getattr(self, k) for k in self.FIELDS}
+        kw.update(changes)
+        return SigmaCurve(**kw)
         
-        z_rho = lambda rho: sigma(z0, zi, rho, n0, ni)[0] 
-        r_rho_2 = lambda rho: rho**2 - z_rho(rho)**2
+    @classmethod
+    def from_gots(cls, G, O, T, S, rho_points, t_shift=0, **kw): 
+        """Curva sigma definida por los parámetros G, O, T, S."""
+        return cls(None, None, None, None, rho_points, t_shift=t_shift,
+                   gots=(G, O, T, S), **kw)
+
+    @property
+    def compiled(self): 
+        if self.gots is not None: 
+            return compile_gots(*self.gots, self.t_shift)
+        return compile_sigma(self.z0, self.zi, self.n0, self.ni, self.t_shift)
+
+    @property
+    def rho_max(self): 
+        """Último ρ muestreado: el borde de la curva menos una tolerancia."""
+        return self.compiled.rho_rim - 1e-6
+
+    def sample_rho(self, rhof=None): 
+        """Valores de ρ en los que get_points muestrea la curva hasta rhof."""
         tol = 1e-6
 
         if rhof is None: 
-            rho_max = mu.biseccion_mod(r_rho_2, tol, 50)
-            rho_max -= tol  
-            rhof = rho_max
+            rhof = self.rho_max
+
+        if self.chord_tol is None: 
+            return np.linspace(tol, rhof, self.rho_points) 
+        return mu.adaptive_samples(self.compiled.zr, tol, rhof, self.chord_tol, self.angle_tol)
 
-        rho = np.linspace(tol, rhof, self.rho_points) 
-        z, r = sigma(z0, zi, rho, n0, ni) 
-        z = z + self.t_shift 
+    @profiled("profile_sampling")
+    def get_points(self, rhof=None): 
+        z, r = self.compiled.zr(self.sample_rho(rhof)) 
         return np.column_stack((z, r)) 
 
+    def get_tangents(self, rhof=None): 
+        """Derivadas analíticas (dz/dρ, dr/dρ) en los puntos de get_points."""
+        dz, dr = self.compiled.zr_jet(self.sample_rho(rhof))[2:]
+        return np.column_stack((dz, dr))
+
     def lambdify(self): 
         """Devuelve funciones z(rho), r(rho) listas para Newton–Raphson."""
 
-        z0, zi = self.z0 - self.t_shift, self.zi - self.t_shift 
-        n0, ni = self.n0, self.ni 
-        z_rho = lambda rho: sigma(z0, zi, rho, n0, ni)[0] + self.t_shift
-        r_rho = lambda rho: sigma(z0, zi, rho, n0, ni)[1]
-        return z_rho, r_rho
+        fn = self.compiled
+        return fn.z, fn.r
 
 
 class OmegaLens: 
 
-    def __init__(self, sigma1: SigmaCurve, sigma2: SigmaCurve): 
+    def __init__(self, sigma1: SigmaCurve, sigma2: SigmaCurve, rho0=None): 
         self.s1 = sigma1
         self.s2 = sigma2 
+        # Parámetros de from_params (los usa replace)
+        self.params = None
+        self.curve_kw = {}
        
-        z1_func, r1_func = self.s1.lambdify() 
-        z2_func, r2_func = self.s2.lambdify()
+        f1 = self.s1.compiled 
+        f2 = self.s2.compiled
 
-        # 1) Calcular intersección en parámetros (rho1, rho2)
-        rho_i1, rho_i2 = intersection_between_curves(z1_func, r1_func,
-                                                     z2_func, r2_func,
-                                                     s1_0=1.0, s2_0=1.0)
+        # 1) Calcular intersección en parámetros (rho1, rho2) con Jacobiano
+        #    exacto, partiendo de rho0 (p.ej. la intersección de una lente
+        #    parecida) o del primer cruce de un barrido sobre Σ₁
+        with stage("intersection"): 
+            rho_i1, rho_i2 = self._solve_intersection(f1, f2, rho0)
 
         self.rho_intersection = (rho_i1, rho_i2)
 
         # 2) Calcular punto físico de intersección
-        z_int = z1_func(rho_i1) + self.s1.t_shift
-        r_int = r1_func(rho_i1)
-        self.intersection_point = (z_int, r_int)
+        self.intersection_point = f1.zr(rho_i1)
 
         # 3) Generar la curva interna
         self.curve = self._generate_inner_curve(rho_i1, rho_i2)
         
+    def _solve_intersection(self, f1, f2, rho0=None): 
+        if rho0 is not None: 
+            # Arranque en caliente: se acepta si converge a un punto válido
+            # que sea el primer cruce desde el eje
+            try: 
+                (rho_i1, rho_i2), self.solver_info = intersection_between_jets(
+                    f1.zr_jet, f2.zr_jet, s1_0=rho0[0], s2_0=rho0[1], full_output=True)
+                if rho_i1 > 0 and rho_i2 > 0 and f1.zr(rho_i1)[1] > 0 and \
+                        is_first_crossing(f1, f2, rho_i1): 
+                    return rho_i1, rho_i2
+            except (RuntimeError, ValueError): 
+                pass
+
+        seed = seed_intersection(f1, f2, self.s1.rho_max,
+                                 max(self.s1.rho_points, SEED_POINTS))
+        s1_0, s2_0 = (1.0, 1.0) if seed is None else seed[0]
+        try: 
+            (rho_i1, rho_i2), self.solver_info = intersection_between_jets(
+                f1.zr_jet, f2.zr_jet, s1_0=s1_0, s2_0=s2_0, full_output=True)
+        except (RuntimeError, ValueError): 
+            if seed is None: 
+                raise
+            # Respaldo: bisección sobre el cruce encontrado en el barrido
+            rho_i1 = mu.biseccion(lambda rho: _crossing_residual(f1, f2, rho),
+                                  *seed[1], tol=1e-12, max_iter=200)
+            rho_i2 = _rho_on_sigma2(f1, f2, rho_i1)
+            self.solver_info = {'iterations': None, 'residual': None, 'nfev': None}
+        return rho_i1, rho_i2
+
+    @staticmethod
+    def curve_args(params): 
+        """
+        Atributos de Σ₁ y Σ₂ (ver SigmaCurve.FIELDS) que dependen de los
+        parámetros de la lente: Σ₁ de z0, z1, n0 y n1; Σ₂ de z1, z2, n0, n1
+        y t (solo su desplazamiento).
+        """
+        t = params.get('t', 0.0)
+        if 'sigma1' in params: 
+            gots = [tuple(params[name][k] for k in 'GOTS') for name in ('sigma1', 'sigma2')]
+            return {'gots': gots[0]}, {'gots': gots[1], 't_shift': t}
+
+        z0, z1, z2 = params['z0'], params['z1'], params['z2']
+        n0, n1 = params['n0'], params['n1']
+        return ({'z0': z0, 'zi': z1, 'n0': n0, 'ni': n1},
+                {'z0': -z1, 'zi': z2, 'n0': n1, 'ni': n0, 't_shift': t})
+
+    @classmethod
+    def from_params(cls, params, rho_points, **curve_kw): 
+        """
+        Lente a partir de un dict con las claves de params.json (z0, z1, z2,
+        n0, n1, t), o con 'sigma1' y 'sigma2' dados por G, O, T, S (y t).
+        """
+        args1, args2 = cls.curve_args(params)
+        if 'sigma1' in params: 
+            sigma1 = SigmaCurve.from_gots(*args1['gots'], rho_points=rho_points, **curve_kw)
+            sigma2 = SigmaCurve.from_gots(*args2['gots'], rho_points=rho_points,
+                                          t_shift=args2['t_shift'], **curve_kw)
+        else: 
+            sigma1 = SigmaCurve(**args1, rho_points=rho_points, **curve_kw)
+            sigma2 = SigmaCurve(**args2, rho_points=rho_points, **curve_kw)
+        lens = cls(sigma1, sigma2)
+        lens.params = dict(params)
+        lens.curve_kw = dict(curve_kw)
+        return lens
+
+    def replace(self, rho_points=None, **changes): 
+        """
+        Lente con los parámetros de changes (claves de params.json)
+        cambiados, recalculando solo lo que depende de ellos: las sigmas que
+        no cambian se reutilizan (con sus coeficientes y su borde) y la
+        intersección arranca desde la actual.
+
+            lens.replace(t=5.0)  # Σ₁ se reutiliza; solo cambia Σ₂
+        """
+        if self.params is None: 
+            raise ValueError("replace necesita una lente creada con from_params")
+        params = dict(self.params, **changes)
+        args1, args2 = self.curve_args(params)
+        if rho_points is not None: 
+            args1['rho_points'] = args2['rho_points'] = rho_points
+        s1 = self.s1.replace(**args1)
+        s2 = self.s2.replace(**args2)
+
+        if s1 is self.s1 and s2 is self.s2: 
+            lens = copy.copy(self)
+        else: 
+            lens = type(self)(s1, s2, rho0=self.rho_intersection)
+        lens.params = params
+        lens.curve_kw = self.curve_kw
+        return lens
+
     def _generate_inner_curve(self, rho_i1, rho_i2): 
         part1 = self.s1.get_points(rho_i1)
         part2 = self.s2.get_points(rho_i2)
@@ -99,3 +385,275 @@ class OmegaLens:
     def get_points(self): 
         return self.curve
 
+    def get_tangents(self): 
+        """
+        Tangente analítica (dz/dρ, dr/dρ) en cada punto de get_points(), en
+        el sentido en que se recorre el perfil (Σ₂ va de su borde al eje).
+        """
+        rho_i1, rho_i2 = self.rho_intersection
+        part1 = self.s1.get_tangents(rho_i1)
+        part2 = self.s2.get_tangents(rho_i2)
+        return np.vstack((part1, -part2[::-1]))
+
+
+# Puntos mínimos del barrido que inicializa la intersección en OmegaLens
+SEED_POINTS = 256
+
+
+def _rho_on_sigma2(f1, f2, rho1): 
+    """ρ₂ del punto de Σ₂ a la misma distancia de su vértice que P₁ = Σ₁(ρ₁)."""
+    z, r = f1.zr(rho1)
+    return np.hypot(z - f2.t_shift, r)
+
+
+def _crossing_residual(f1, f2, rho1): 
+    """z₂(ρ₂) - z₁(ρ₁) con ρ₂ = |P₁ - (t₂, 0)|; se anula en la intersección."""
+    with np.errstate(invalid='ignore'): 
+        return f2.z(_rho_on_sigma2(f1, f2, rho1)) - f1.z(rho1)
+
+
+def seed_intersection(f1, f2, rho_max, n): 
+    """
+    Barrido lineal de n muestras de Σ₁ buscando el primer cruce con Σ₂.
+
+    Retorna ((ρ₁, ρ₂) inicial, (a, b) intervalo de ρ₁ con el cruce), o None.
+    """
+    rho = np.linspace(1e-6, rho_max, n)
+    g = _crossing_residual(f1, f2, rho)
+
+    change = np.isfinite(g[:-1]) & np.isfinite(g[1:]) & (np.sign(g[:-1]) != np.sign(g[1:]))
+    if not change.any(): 
+        return None
+    k = int(np.argmax(change))
+
+    a, b = float(rho[k]), float(rho[k + 1])
+    rho1 = a - g[k]*(b - a)/(g[k + 1] - g[k])
+    return (float(rho1), float(_rho_on_sigma2(f1, f2, rho1))), (a, b)
+
+
+# Muestras de (0, ρ₁) con que is_first_crossing valida una raíz
+CHECK_POINTS = 64
+
+
+def is_first_crossing(f1, f2, rho1, n=CHECK_POINTS, chunk=512):
+    """
+    True si Σ₁ no cruza Σ₂ antes de ρ₁: el residuo de la intersección no
+    cambia de signo en n muestras de (0, ρ₁). Valida las raíces de un
+    arranque en caliente (que pueden ser otro cruce más lejos del eje) sin
+    repetir el barrido hasta el borde. rho1 puede ser un arreglo con una
+    raíz por lente (curvas de forma (m, 1)); se recorre en bloques de chunk
+    lentes.
+    """
+    steps = np.linspace(0, 1, n, endpoint=False)
+
+    def no_change(f1, f2, rho1):
+        with np.errstate(all='ignore'):
+            g = _crossing_residual_grid(f1, f2, 1e-6 + (rho1[..., None] - 1e-6)*steps)
+        return ~(np.any(g > 0, axis=-1) & np.any(g < 0, axis=-1))
+
+    rho1 = np.asarray(rho1, dtype=float)
+    if rho1.ndim == 0:
+        return bool(no_change(f1, f2, rho1))
+    ok = np.empty(rho1.shape, dtype=bool)
+    for start in range(0, len(rho1), chunk):
+        blk = slice(start, start + chunk)
+        ok[blk] = no_change(f1.take(blk), f2.take(blk), rho1[blk])
+    return ok
+
+
+def compile_lens_batch(z0, z1, z2, n0, n1, t):
+    """
+    Σ₁ y Σ₂ compiladas de muchas lentes a la vez: CompiledSigma con un
+    coeficiente por lente (arreglos 1D), reutilizables en la intersección
+    (intersect_lens_batch), en el muestreo de perfiles o en el trazado de
+    rayos.
+    """
+    z0, z1, z2, n0, n1, t = (np.ravel(v) for v in np.broadcast_arrays(
+        *(np.asarray(v, dtype=float) for v in (z0, z1, z2, n0, n1, t))))
+    with np.errstate(all='ignore'):
+        f1 = CompiledSigma(*sigma_coefficients(z0, z1, n0, n1), 0.0)
+        f2 = CompiledSigma(*sigma_coefficients(-z1 + t, z2 - t, n1, n0), t)
+    return f1, f2
+
+
+@profiled("intersection_batch")
+def intersect_lens_batch(f1, f2, rho0=None, tol=1e-10, max_iter=50,
+                         n_bracket=256):
+    """
+    Intersección de las curvas de compile_lens_batch (n lentes).
+
+    Como en OmegaLens, la intersección es el primer cruce de Σ₁ con Σ₂
+    desde el eje. Con rho0 (escalares o arreglos de n), p.ej. la solución
+    de una lente nominal cercana, Newton arranca desde él y cada raíz se
+    valida con is_first_crossing; solo las lentes que no pasan se resuelven
+    como sin rho0: Newton desde el primer cruce de un barrido de n_bracket
+    muestras de Σ₁ hasta su borde y, si la raíz queda fuera de ese
+    intervalo (otro cruce, cerca de los bordes), bisección en él.
+
+    Retorna un dict como solve_lens_batch, con arreglos de n.
+    """
+    n = np.broadcast(f1.G, f2.G, f2.t_shift).size
+    cols = (slice(None), None)
+
+    with np.errstate(all='ignore'):
+        if rho0 is None:
+            rho1, rho2, converged, iterations = _solve_from_sweep(
+                f1, f2, n, tol, max_iter, n_bracket)
+        else:
+            x0 = tuple(np.array(np.broadcast_to(np.asarray(v, dtype=float).ravel(), (n,)))
+                       for v in np.broadcast_arrays(*rho0))
+            rho1, rho2, converged, iterations = _newton_lens_batch(f1, f2, x0, tol, max_iter)
+            converged &= is_first_crossing(f1.take(cols), f2.take(cols), rho1)
+
+            redo = np.flatnonzero(~converged)
+            if redo.size:
+                rho1[redo], rho2[redo], converged[redo], extra = _solve_from_sweep(
+                    f1.take(redo), f2.take(redo), redo.size, tol, max_iter, n_bracket)
+                iterations[redo] += extra
+
+        z, r = f1.zr(rho1)
+
+    return {
+        'rho1': rho1, 'rho2': rho2, 'z': z, 'r': r, 'diameter': 2*r,
+        'converged': converged, 'iterations': iterations,
+    }
+
+
+def solve_lens_batch(z0, z1, z2, n0, n1, t, rho0=None, tol=1e-10,
+                     max_iter=50, n_bracket=256):
+    """
+    Intersección Σ₁/Σ₂ de muchas lentes Ω a la vez.
+
+    Los parámetros son arreglos (o escalares) compatibles por broadcasting,
+    con el mismo significado que en params.json. Cada lente parte de rho0
+    o, sin él (o si la raíz no es el primer cruce), del primer cruce de un
+    barrido sobre Σ₁ (como OmegaLens) y se resuelve con un Newton
+    vectorizado con Jacobiano exacto; las que no convergen al primer cruce
+    se resuelven con bisección sobre la ecuación escalar
+    z₂(|P₁ - (t, 0)|) = z₁(ρ₁) en el intervalo del barrido.
+
+    Retorna un dict con arreglos 'rho1', 'rho2', 'z', 'r', 'diameter',
+    'converged' e 'iterations', todos con la forma de los parámetros.
+    """
+    shape = np.broadcast(*(np.asarray(v) for v in (z0, z1, z2, n0, n1, t))).shape
+    f1, f2 = compile_lens_batch(z0, z1, z2, n0, n1, t)
+    out = intersect_lens_batch(f1, f2, rho0, tol=tol, max_iter=max_iter,
+                               n_bracket=n_bracket)
+    return {k: v.reshape(shape) for k, v in out.items()}
+
+
+def _newton_lens_batch(f1, f2, x0, tol, max_iter):
+    """Newton vectorizado desde x0 = (ρ₁, ρ₂); solo converge a puntos de la lente (r > 0)."""
+    def FJ(s1, s2, idx):
+        za, ra, dza, dra = f1.take(idx).zr_jet(s1)
+        zb, rb, dzb, drb = f2.take(idx).zr_jet(s2)
+        return (za - zb, ra - rb), ((dza, -dzb), (dra, -drb))
+
+    rho1, rho2, converged, iterations = mu.newton_raphson_2d_batch(
+        FJ, x0, tol=tol, max_iter=max_iter)
+    converged &= (f1.r(rho1) > 0) & (rho1 > 0) & (rho2 > 0)
+    return rho1, rho2, converged, iterations
+
+
+def _solve_from_sweep(f1, f2, n, tol, max_iter, n_bracket):
+    """
+    intersect_lens_batch sin arranque en caliente: Newton desde el primer
+    cruce del barrido y bisección en su intervalo si la raíz queda fuera.
+    """
+    t = np.broadcast_to(f2.t_shift, (n,))
+    cols = (slice(None), None)
+    found, a, b, seed = _first_crossing(f1.take(cols), f2.take(cols),
+                                        np.broadcast_to(f1.rho_rim, (n,)), n_bracket)
+
+    x0 = (np.where(found, seed, 1.0), np.where(found, _rho_on_sigma2(f1, f2, seed), 1.0))
+    rho1, rho2, converged, iterations = _newton_lens_batch(f1, f2, x0, tol, max_iter)
+    # Solo vale el primer cruce desde el eje
+    slack = 1e-9*np.maximum(1.0, b)
+    converged &= ~found | ((rho1 >= a - slack) & (rho1 <= b + slack))
+
+    failed = np.flatnonzero(~converged & found)
+    if failed.size:
+        rho1[failed], rho2[failed], converged[failed] = _bisect_crossing(
+            f1.take(failed), f2.take(failed), t[failed], a[failed], b[failed], tol)
+    return rho1, rho2, converged, iterations
+
+
+def _first_crossing(f1, f2, rho_max, n_bracket, chunk=128):
+    """
+    Barrido vectorizado de seed_intersection: n_bracket muestras de Σ₁
+    entre 1e-6 y rho_max de cada lente (curvas de forma (n, 1)). Se
+    recorre en bloques de chunk lentes para que la malla quepa en caché.
+
+    Retorna (máscara de lentes con cruce, extremos a y b del intervalo de
+    ρ₁ del primer cruce, ρ₁ interpolado dentro de él).
+    """
+    n = len(rho_max)
+    hi = np.where(np.isfinite(rho_max), rho_max - 1e-6, np.nan)
+    steps = np.linspace(0, 1, n_bracket)
+    found = np.zeros(n, dtype=bool)
+    a, b, seed = np.empty(n), np.empty(n), np.empty(n)
+
+    for start in range(0, n, chunk):
+        blk = slice(start, start + chunk)
+        grid = 1e-6 + (hi[blk] - 1e-6)[:, None]*steps
+        gv = _crossing_residual_grid(f1.take(blk), f2.take(blk), grid)
+
+        change = np.isfinite(gv[:, :-1]) & np.isfinite(gv[:, 1:]) & \
+                 (np.sign(gv[:, :-1]) != np.sign(gv[:, 1:]))
+        found[blk] = change.any(axis=1)
+        k = np.argmax(change, axis=1)
+        rows = np.arange(len(k))
+        a[blk], b[blk] = grid[rows, k], grid[rows, k + 1]
+        ga, gb = gv[rows, k], gv[rows, k + 1]
+        seed[blk] = a[blk] - ga*(b[blk] - a[blk])/(gb - ga)
+
+    seed[~found] = np.nan
+    return found, a, b, seed
+
+
+def _sag(f, u):
+    """z - t_shift de la sigma f en ρ² = u, operando en el sitio."""
+    den = f.K*u
+    den += 1
+    np.sqrt(den, out=den)
+    den += 1
+    den += f.S*u
+    num = f.T*u
+    num += f.O
+    num *= u
+    num /= den
+    return num
+
+
+def _crossing_residual_grid(f1, f2, rho1):
+    """
+    _crossing_residual sobre una malla grande de ρ₁. Con u = ρ₁² y
+    r² = u - z², ρ₂² = u - 2zt + t² (t = t₂), sin raíces ni hypot; los
+    puntos con u < z² (fuera de Σ₁) quedan en nan.
+    """
+    t = f2.t_shift
+    u = rho1*rho1
+    z = _sag(f1, u)
+    z += f1.t_shift
+    u2 = u - 2*z*t
+    u2 += t*t
+    g = _sag(f2, u2)
+    g += f2.t_shift
+    g -= z
+    g[u < z*z] = np.nan
+    return g
+
+
+def _bisect_crossing(f1, f2, t, a, b, tol):
+    """
+    Respaldo de intersect_lens_batch: bisección vectorizada en ρ₁ sobre el
+    intervalo [a, b] del primer cruce de cada lente.
+    """
+    def g(rho1):
+        z, r = f1.zr(rho1)
+        return f2.z(np.hypot(z - t, r)) - z
+
+    rho1 = mu.biseccion_batch(g, a, b, tol=tol)
+    z, r = f1.zr(rho1)
+    rho2 = np.hypot(z - t, r)
+    return rho1, rho2, r > 0
@@ -1,52 +1,552 @@
+import os
+from collections import OrderedDict
+
 import numpy as np 
 
-def revolve_curve(curve_pts, n_ang): 
+from profiling import profiled
 
-    n_theta = curve_pts.shape[0] 
-    n_phi = 2*n_ang 
 
-    phi = np.linspace(0, 2*np.pi, n_phi, endpoint=False) 
+@profiled("revolve_curve")
+def revolve_curve(curve_pts, n_ang, watertight=False, dtype=np.float64,
+                  tangents=None): 
+    """
+    Superficie de revolución de la curva (z, r). El perfil se evalúa en
+    float64; dtype es el tipo del arreglo de vértices (np.float32 para
+    exportar o visualizar con la mitad de memoria).
+
+    Con tangents (N x 2, derivadas (dz, dr) del perfil, p.ej. las de
+    OmegaLens.get_tangents()) retorna también las normales analíticas de
+    cada vértice: (vértices, caras, normales). Los arreglos son propios
+    del resultado y se pueden modificar.
+    """
+
+    if watertight:
+        return revolve_curve_watertight(curve_pts, n_ang, dtype=dtype, tangents=tangents)
+
+    mesh = RevolvedMesh(curve_pts, n_ang, dtype=dtype, tangents=tangents)
+    if tangents is None: 
+        return mesh.materialize()
+    return (*mesh.materialize(), mesh.vertex_normals())
+
+
+def dedupe_mask(curve_pts, tol=1e-9):
+    """
+    Máscara de los puntos del perfil sin los repetidos consecutivos (p.ej.
+    la unión entre Σ₁ y Σ₂).
+    """
+    step = np.linalg.norm(np.diff(curve_pts, axis=0), axis=1)
+    return np.concatenate(([True], step > tol))
+
+
+def profile_normals(tangents, keep=None):
+    """
+    Normales unitarias (n_z, n_r) del perfil a partir de su tangente
+    (dz, dr), con el sentido de las caras de generate_mesh_from_vertices_numpy.
+
+    Con keep (máscara de dedupe_mask) las normales de cada grupo de
+    puntos repetidos se promedian: en la unión Σ₁/Σ₂ la normal es la
+    bisectriz de las dos superficies.
+    """
+    t = np.asarray(tangents, dtype=float)
+    # Tangente vertical (dr infinito en el borde de una sigma)
+    inf = np.isinf(t)
+    t = np.where(inf.any(axis=1, keepdims=True), np.where(inf, np.sign(t), 0.0), t)
+
+    n = np.column_stack((t[:, 1], -t[:, 0]))
+    n /= np.hypot(n[:, 0], n[:, 1])[:, None]
+    if keep is not None: 
+        n = np.add.reduceat(n, np.flatnonzero(keep), axis=0)
+        n /= np.hypot(n[:, 0], n[:, 1])[:, None]
+    return n
+
+
+def revolve_curve_watertight(curve_pts, n_ang, axis_tol=1e-5, seam_tol=1e-9,
+                             dtype=np.float64, tangents=None):
+    """
+    Superficie de revolución compacta y cerrada.
+
+    Los puntos del perfil con r < axis_tol (los vértices de la lente) se
+    sustituyen por un único vértice polar sobre el eje y un abanico de
+    triángulos en lugar de un anillo de 2*n_ang vértices coincidentes.
+    Los puntos repetidos consecutivos, como la unión Σ₁/Σ₂, se eliminan.
+    Si ambos extremos del perfil están sobre el eje la malla es cerrada y
+    sus caras se orientan con las normales hacia afuera.
+
+    Con tangents retorna también las normales analíticas por vértice.
+    """
+    mesh = RevolvedMesh(curve_pts, n_ang, dtype=dtype, tangents=tangents, watertight=True,
+                        axis_tol=axis_tol, seam_tol=seam_tol)
+    if tangents is None: 
+        return mesh.materialize()
+    return (*mesh.materialize(), mesh.vertex_normals())
+
+
+def profile_volume(curve_pts):
+    """
+    Volumen con signo (sin el factor π/3) del sólido que encierra el perfil
+    al revolucionarlo: positivo si revolve_curve_watertight invierte las
+    caras para orientarlas hacia afuera.
+    """
+    z, r = curve_pts[:, 0], curve_pts[:, 1]
+    return float(np.sum((r[:-1]**2 + r[:-1]*r[1:] + r[1:]**2) * np.diff(z)))
+
+
+@profiled("revolve_update")
+def update_revolved(vertices, old_pts, new_pts, n_ang, watertight=False,
+                    normals=None, tangents=None, axis_tol=1e-5, seam_tol=1e-9):
+    """
+    Actualiza en su lugar los vértices de revolve_curve(old_pts, n_ang,
+    watertight) para el perfil new_pts: solo se recalculan los anillos cuyo
+    punto (z, r) cambió y las caras se reutilizan tal cual. Con normals y
+    tangents (las de new_pts) se actualizan también las normales.
+
+    Retorna los índices (del perfil sin puntos repetidos) de los anillos
+    reescritos, o None si cambia la topología (número de puntos, polos,
+    puntos repetidos u orientación); entonces hay que volver a llamar a
+    revolve_curve.
+    """
+    old_pts = np.asarray(old_pts, dtype=float)
+    new_pts = np.asarray(new_pts, dtype=float)
+    if old_pts.shape != new_pts.shape:
+        return None
+    n_phi = 2*n_ang
+
+    keep = None
+    flip = False
+    if watertight:
+        keep = dedupe_mask(new_pts, seam_tol)
+        if not np.array_equal(keep, dedupe_mask(old_pts, seam_tol)):
+            return None
+        old_pts, new_pts = old_pts[keep], new_pts[keep]
+        pole = new_pts[:, 1] < axis_tol
+        if not np.array_equal(pole, old_pts[:, 1] < axis_tol):
+            return None
+        # Solo perfiles cerrados: su orientación sale del propio perfil
+        if pole.any() and not (pole[0] and pole[-1]):
+            return None
+        flip = profile_volume(new_pts) > 0
+        if flip != (profile_volume(old_pts) > 0):
+            return None
+    else:
+        pole = np.zeros(len(new_pts), dtype=bool)
 
-    z = curve_pts[:, 0] 
+    counts = np.where(pole, 1, n_phi)
+    offset = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    moved = np.any(old_pts != new_pts, axis=1)
+    z, r = new_pts[:, 0], new_pts[:, 1]
+
+    for start, stop in _runs(moved & ~pole):
+        ring_vertices(z[start:stop], r[start:stop], n_phi,
+                      out=vertices[offset[start]:offset[start] + (stop - start)*n_phi])
+    at = moved & pole
+    vertices[offset[at], 2] = z[at]
+
+    if normals is not None:
+        nzr = profile_normals(tangents, keep)
+        if flip:
+            np.negative(nzr, out=nzr)
+        for start, stop in _runs(moved & ~pole):
+            ring_vertices(nzr[start:stop, 0], nzr[start:stop, 1], n_phi,
+                          out=normals[offset[start]:offset[start] + (stop - start)*n_phi])
+        normals[offset[at], 2] = np.sign(nzr[at, 0])
+
+    return np.flatnonzero(moved)
+
+
+def _runs(mask):
+    """Pares (inicio, fin) de los tramos consecutivos de True en mask."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+
+
+def flip_faces(faces): 
+    """Invierte en su lugar la orientación de todas las caras."""
+    tmp = faces[:, 1].copy()
+    faces[:, 1] = faces[:, 2]
+    faces[:, 2] = tmp
+
+
+def azimuth_counts(r, sag_tol, n_min=6, n_max=4096, axis_tol=1e-5):
+    """
+    Número de pasos azimutales por anillo para que la flecha de cada cuerda,
+    r·(1 - cos(π/n)), no supere sag_tol. Los anillos sobre el eje son polos (1).
+    """
+    r = np.asarray(r, dtype=float)
+    ratio = np.clip(1.0 - sag_tol / np.maximum(r, axis_tol), -1.0, 1.0)
+    with np.errstate(divide='ignore'):
+        n = np.ceil(np.pi / np.arccos(ratio))
+    n = np.clip(np.nan_to_num(n, posinf=n_max), n_min, n_max).astype(np.int64)
+    return np.where(r < axis_tol, 1, n)
+
+
+def stitch_rings(oa, na, ob, nb):
+    """
+    Tira de transición entre un anillo de na vértices (desde el índice oa) y
+    otro de nb vértices (desde ob). Ambos empiezan en φ = 0; los avances de
+    cada anillo se intercalan por ángulo. Con na == nb se obtienen las mismas
+    caras que en revolve_curve y con na o nb igual a 1 un abanico.
+    """
+    # Ángulos exactos en unidades de 2π/(na*nb)
+    key = np.concatenate((np.arange(1, nb + 1) * na, np.arange(1, na + 1) * nb))
+    from_a = np.concatenate((np.zeros(nb, bool), np.ones(na, bool)))
+    order = np.lexsort((from_a, key))
+    from_a = from_a[order]
+
+    # Posición de cada anillo antes del avance
+    i = np.cumsum(from_a) - from_a
+    k = np.cumsum(~from_a) - ~from_a
+
+    tri = np.empty((na + nb, 3), dtype=np.int64)
+    tri[:, 0] = oa + i % na
+    tri[:, 1] = ob + k % nb
+    tri[:, 2] = np.where(from_a, oa + (i + 1) % na, ob + (k + 1) % nb)
+
+    # Un polo no avanza: sus triángulos serían degenerados
+    keep = ~from_a if na == 1 else (from_a if nb == 1 else slice(None))
+    return tri[keep]
+
+
+@profiled("revolve_curve_adaptive")
+def revolve_curve_adaptive(curve_pts, sag_tol, n_min=6, n_max=4096,
+                           axis_tol=1e-5, seam_tol=1e-9, dtype=np.float64,
+                           tangents=None):
+    """
+    Superficie de revolución con resolución azimutal variable por anillo.
+
+    Cada anillo usa el mínimo número de pasos tal que la flecha de las
+    cuerdas sea menor que sag_tol (en las unidades de la curva, cm). Los
+    anillos con distinto número de vértices se unen con tiras de transición
+    y los puntos sobre el eje se tratan como polos, igual que en
+    revolve_curve_watertight (también en las normales si se da tangents).
+    """
+    curve_pts = np.asarray(curve_pts, dtype=float)
+    keep = dedupe_mask(curve_pts, seam_tol)
+    curve_pts = curve_pts[keep]
+    z = curve_pts[:, 0]
     r = curve_pts[:, 1]
 
-    R, PHI = np.meshgrid(r, phi, indexing='ij') 
-    Z, _ = np.meshgrid(z, phi, indexing='ij') 
+    counts = azimuth_counts(r, sag_tol, n_min, n_max, axis_tol)
+    offset = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    n_vert = int(counts.sum())
+
+    ring_id = np.repeat(np.arange(len(counts)), counts)
+    phi = 2*np.pi * (np.arange(n_vert) - offset[ring_id]) / counts[ring_id]
+    rr = np.where(counts[ring_id] == 1, 0.0, r[ring_id])
+    vertices = np.empty((n_vert, 3), dtype=dtype)
+    np.multiply(rr, np.cos(phi), out=vertices[:, 0])
+    np.multiply(rr, np.sin(phi), out=vertices[:, 1])
+    vertices[:, 2] = z[ring_id]
+
+    normals = None
+    if tangents is not None: 
+        nzr = profile_normals(tangents, keep)
+        pole = counts[ring_id] == 1
+        nr = np.where(pole, 0.0, nzr[ring_id, 1])
+        normals = np.empty((n_vert, 3), dtype=dtype)
+        np.multiply(nr, np.cos(phi), out=normals[:, 0])
+        np.multiply(nr, np.sin(phi), out=normals[:, 1])
+        normals[:, 2] = np.where(pole, np.sign(nzr[ring_id, 0]), nzr[ring_id, 0])
+
+    strips = [stitch_rings(offset[i], counts[i], offset[i+1], counts[i+1])
+              for i in range(len(counts) - 1)
+              if counts[i] > 1 or counts[i+1] > 1]
+    faces = np.concatenate(strips).astype(index_dtype(n_vert))
+
+    # Normales hacia afuera (ver revolve_curve_watertight)
+    if profile_volume(curve_pts) > 0:
+        flip_faces(faces)
+        if normals is not None: 
+            np.negative(normals, out=normals)
+
+    if normals is not None: 
+        return vertices, faces, normals
+    return vertices, faces
+
+
+def signed_volume(vertices, faces):
+    """Volumen con signo de una malla cerrada (positivo si las normales apuntan hacia afuera)."""
+    p1, p2, p3 = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+    return np.einsum('ij,ij->', p1, np.cross(p2, p3)) / 6.0
+
+
+def ring_vertices(z, r, n_phi, dtype=np.float64, out=None): 
+    """
+    Vértices de los anillos (z_i, r_i) revolucionados con n_phi pasos
+    azimutales. Se calculan en float64 y se escriben directamente en out
+    (o en un arreglo nuevo de tipo dtype), sin copias intermedias.
+    """
+
+    phi = np.linspace(0, 2*np.pi, n_phi, endpoint=False) 
+
+    if out is None: 
+        out = np.empty((len(z)*n_phi, 3), dtype=dtype)
+    grid = out.reshape(len(z), n_phi, 3)
+    np.multiply.outer(r, np.cos(phi), out=grid[:, :, 0])
+    np.multiply.outer(r, np.sin(phi), out=grid[:, :, 1])
+    grid[:, :, 2] = np.asarray(z)[:, None]
+
+    return out
+
+
+class RevolvedMesh: 
+    """
+    Superficie de revolución guardada solo como perfil (z, r) y número de
+    pasos azimutales. Vértices y caras se generan bajo demanda, con la misma
+    numeración que revolve_curve:
+
+      mesh[i]               vértice(s) por índice global (int, slice o arreglo)
+      mesh.ring(i)          vértices del anillo i
+      mesh.faces_band(a, b) caras entre los anillos a y b (índices globales)
+      mesh.iter_vertices(), mesh.iter_faces(), mesh.iter_bands()
+      np.asarray(mesh)      todos los vértices; mesh.materialize() -> (vértices, caras)
+
+    Los vértices se generan con el tipo dtype (p.ej. np.float32). Con
+    tangents (derivadas (dz, dr) del perfil) también las normales
+    analíticas: mesh.ring_normals(a, b), mesh.iter_normals(),
+    mesh.vertex_normals().
+
+    Con watertight la malla es la de revolve_curve_watertight: sin puntos
+    repetidos del perfil, los puntos con r < axis_tol como polos de un solo
+    vértice unidos a su anillo vecino por un abanico, y las caras hacia
+    afuera.
+    """
+
+    def __init__(self, curve_pts, n_ang, dtype=np.float64, tangents=None,
+                 watertight=False, axis_tol=1e-5, seam_tol=1e-9): 
+        curve_pts = np.asarray(curve_pts, dtype=float)
+        keep = None
+        if watertight: 
+            keep = dedupe_mask(curve_pts, seam_tol)
+            curve_pts = curve_pts[keep]
+        self.dtype = np.dtype(dtype)
+        self.watertight = watertight
+        self.z = np.ascontiguousarray(curve_pts[:, 0])
+        self.r = np.ascontiguousarray(curve_pts[:, 1])
+        self.n_phi = 2*n_ang
+        phi = np.linspace(0, 2*np.pi, self.n_phi, endpoint=False)
+        self._cos = np.cos(phi)
+        self._sin = np.sin(phi)
+
+        # Polos (un vértice) y posición de cada anillo en la numeración global
+        self.pole = self.r < axis_tol if watertight else np.zeros(len(self.z), dtype=bool)
+        counts = np.where(self.pole, 1, self.n_phi)
+        self.offset = np.concatenate(([0], np.cumsum(counts)))
+        # El sentido de las caras depende de cómo se recorre el perfil
+        self.flip = watertight and profile_volume(curve_pts) > 0
+
+        self.profile_normals = None
+        if tangents is not None: 
+            self.profile_normals = profile_normals(tangents, keep)
+            if self.flip: 
+                np.negative(self.profile_normals, out=self.profile_normals)
+
+    @property
+    def n_theta(self): 
+        return len(self.z)
+
+    @property
+    def n_vertices(self): 
+        return int(self.offset[-1])
+
+    @property
+    def n_faces(self): 
+        a, b = self.pole[:-1], self.pole[1:]
+        return int(2*self.n_phi*np.sum(~a & ~b) + self.n_phi*np.sum(a != b))
+
+    def __len__(self): 
+        return self.n_vertices
+
+    def ring(self, i): 
+        return self.rings(i, i + 1)
+
+    def rings(self, start, stop): 
+        """Vértices de los anillos start..stop-1, en un arreglo (n, 3) (un vértice por polo)."""
+        return self._revolve(self.z, self.r, start, stop, self.z)
 
-    X = R*np.cos(PHI) 
-    Y = R*np.sin(PHI) 
+    @property
+    def has_normals(self): 
+        return self.profile_normals is not None
 
+    def ring_normals(self, start, stop): 
+        """Normales de los vértices de los anillos start..stop-1."""
+        n = self.profile_normals
+        return self._revolve(n[:, 0], n[:, 1], start, stop, np.sign(n[:, 0]))
 
-    vertices = np.column_stack((X.ravel(), Y.ravel(), Z.ravel()))
-    faces = generate_mesh_from_vertices(vertices, n_theta, n_phi) 
+    def _revolve(self, z, r, start, stop, z_pole): 
+        """(z, r) de los anillos start..stop-1 revolucionados; en los polos, (0, 0, z_pole)."""
+        base = self.offset[start]
+        out = np.empty((self.offset[stop] - base, 3), dtype=self.dtype)
+        pole = self.pole[start:stop]
+        for a, b in _runs(~pole): 
+            a, b = a + start, b + start
+            ring_vertices(z[a:b], r[a:b], self.n_phi,
+                          out=out[self.offset[a] - base:self.offset[b] - base])
+        if pole.any(): 
+            at = np.flatnonzero(pole) + start
+            out[self.offset[at] - base, :2] = 0
+            out[self.offset[at] - base, 2] = z_pole[at]
+        return out
 
-    return vertices, faces 
+    def iter_normals(self, rows=1024): 
+        for i in range(0, self.n_theta, rows): 
+            yield self.ring_normals(i, min(i + rows, self.n_theta))
+
+    def vertex_normals(self): 
+        return self.ring_normals(0, self.n_theta)
+
+    def __getitem__(self, idx): 
+        if isinstance(idx, slice): 
+            idx = np.arange(*idx.indices(self.n_vertices))
+        idx = np.asarray(idx)
+        if idx.ndim == 0 and not -self.n_vertices <= idx < self.n_vertices: 
+            raise IndexError(f"vertex index {int(idx)} out of range")
+        idx = idx % self.n_vertices
+        i = np.searchsorted(self.offset, idx, side='right') - 1
+        j = idx - self.offset[i]
+        r = np.where(self.pole[i], 0.0, self.r[i])
+        return np.stack((r*self._cos[j], r*self._sin[j], self.z[i]), axis=-1).astype(self.dtype)
+
+    def _regular(self, start, stop): 
+        """True si entre los anillos start y stop solo hay bandas sin invertir."""
+        return not self.flip and not self.pole[start:stop + 1].any()
+
+    def faces_band(self, start, stop): 
+        """Caras de las celdas entre los anillos start y stop (stop > start)."""
+        dtype = index_dtype(self.n_vertices)
+        if self._regular(start, stop): 
+            local = generate_mesh_from_vertices_numpy(stop - start + 1, self.n_phi)
+            return local.astype(dtype) + dtype(self.offset[start])
+
+        # Por segmento del perfil: banda (anillo-anillo), abanico (polo-anillo
+        # o anillo-polo) o nada (polo-polo, sobre el eje)
+        a, b = self.pole[start:stop], self.pole[start + 1:stop + 1]
+        band = ~a & ~b
+        n_faces = int(2*self.n_phi*band.sum() + self.n_phi*np.sum(a != b))
+        faces = np.empty((n_faces, 3), dtype=dtype)
+        offset = self.offset[start:stop + 1]
+
+        j = np.arange(self.n_phi)
+        j2 = (j + 1) % self.n_phi
+        k = 0
+        for i in range(len(a)): 
+            if band[i]: 
+                # Tramo de bandas: la topología es la de una malla regular
+                if i > 0 and band[i - 1]: 
+                    continue
+                end = i
+                while end < len(band) and band[end]: 
+                    end += 1
+                topo = generate_mesh_from_vertices_numpy(end - i + 1, self.n_phi)
+                faces[k:k + len(topo)] = topo
+                faces[k:k + len(topo)] += dtype(offset[i])
+                k += len(topo)
+            elif a[i] and not b[i]: 
+                # Polo -> anillo: (polo, b_j, b_j2)
+                faces[k:k + self.n_phi, 0] = offset[i]
+                faces[k:k + self.n_phi, 1] = offset[i + 1] + j
+                faces[k:k + self.n_phi, 2] = offset[i + 1] + j2
+                k += self.n_phi
+            elif b[i] and not a[i]: 
+                # Anillo -> polo: (a_j, polo, a_j2)
+                faces[k:k + self.n_phi, 0] = offset[i] + j
+                faces[k:k + self.n_phi, 1] = offset[i + 1]
+                faces[k:k + self.n_phi, 2] = offset[i] + j2
+                k += self.n_phi
+
+        if self.flip: 
+            flip_faces(faces)
+        return faces
+
+    def iter_vertices(self, rows=1024): 
+        for i in range(0, self.n_theta, rows): 
+            yield self.rings(i, min(i + rows, self.n_theta))
+
+    def iter_faces(self, rows=1024): 
+        for i in range(0, self.n_theta - 1, rows): 
+            yield self.faces_band(i, min(i + rows, self.n_theta - 1))
+
+    def iter_bands(self, rows=1024): 
+        """
+        Bandas autocontenidas (vértices, caras locales) de hasta rows celdas
+        de alto, para escribir triángulos sin índices globales (STL).
+        """
+        for i in range(0, self.n_theta - 1, rows): 
+            k = min(rows, self.n_theta - 1 - i)
+            if self._regular(i, i + k): 
+                local = generate_mesh_from_vertices_numpy(k + 1, self.n_phi)
+            else: 
+                local = self.faces_band(i, i + k)
+                local -= local.dtype.type(self.offset[i])
+            yield self.rings(i, i + k + 1), local
+
+    def __array__(self, dtype=None, copy=None): 
+        vertices = self.rings(0, self.n_theta)
+        return vertices if dtype is None else vertices.astype(dtype)
+
+    def materialize(self): 
+        """(vértices, caras) completos; las caras son un arreglo propio, modificable."""
+        if self.n_theta < 2: 
+            return np.asarray(self), np.empty((0, 3), dtype=index_dtype(self.n_vertices))
+        if self._regular(0, self.n_theta - 1): 
+            faces = generate_mesh_from_vertices_numpy(self.n_theta, self.n_phi).copy()
+        else: 
+            faces = self.faces_band(0, self.n_theta - 1)
+        return np.asarray(self), faces
 
 
 def generate_mesh_from_vertices(verts, n_theta, n_phi): 
-    
-    faces = []
+    """Caras de la malla (n_theta x n_phi); copia modificable de la versión vectorizada."""
+    return generate_mesh_from_vertices_numpy(n_theta, n_phi).copy()
 
-    for i in range(n_theta - 1): 
-        for j in range(n_phi): 
 
-            j2 = (j + 1) % n_phi
-            v0 = i     * n_phi + j
-            v1 = (i+1) * n_phi + j
-            v2 = (i+1) * n_phi + j2
-            v3 = i     * n_phi + j2
-            faces.append([v0, v1, v2])
-            faces.append([v0, v2, v3])
+# Conectividades recientes: todas las lentes con la misma discretización
+# comparten las mismas caras. La caché se limita por memoria y no por número
+# de entradas (las caras de la lente con N_RHO = 1000 y N_ANG = 500 ocupan
+# unos 46 MB).
+FACE_CACHE_BYTES = 256 * 1024**2
+_face_cache = OrderedDict()
 
-    faces = np.array(faces, dtype=int)
 
-    return faces 
+def index_dtype(n_vertices):
+    """uint32 si los índices caben, int64 en caso contrario."""
+    return np.uint32 if n_vertices <= np.iinfo(np.uint32).max else np.int64
 
 
 def generate_mesh_from_vertices_numpy(n_theta, n_phi): 
+    """
+    Caras de la malla (n_theta x n_phi) en forma vectorizada.
+
+    El resultado se guarda en caché (LRU de hasta FACE_CACHE_BYTES) y es de
+    solo lectura; hay que copiarlo antes de modificarlo. revolve_curve y
+    RevolvedMesh.materialize retornan copias.
+    """
+    key = (n_theta, n_phi)
+    faces = _face_cache.get(key)
+    if faces is not None: 
+        _face_cache.move_to_end(key)
+        return faces
+
+    faces = _build_faces(n_theta, n_phi)
+    faces.flags.writeable = False
+    if faces.nbytes <= FACE_CACHE_BYTES: 
+        _face_cache[key] = faces
+        cached = sum(f.nbytes for f in _face_cache.values())
+        while cached > FACE_CACHE_BYTES: 
+            _, old = _face_cache.popitem(last=False)
+            cached -= old.nbytes
+    return faces
+
+
+def clear_face_cache(): 
+    _face_cache.clear()
+
+
+@profiled("faces")
+def _build_faces(n_theta, n_phi): 
+    dtype = index_dtype(n_theta*n_phi)
 
     n_cells = (n_theta - 1)*n_phi 
-    k = np.arange(n_cells) 
+    k = np.arange(n_cells, dtype=dtype) 
     i = k // n_phi 
     j = k % n_phi
     j2 = (j + 1) % n_phi 
@@ -54,7 +554,7 @@ def generate_mesh_from_vertices_numpy(n_theta, n_phi):
     base = i*n_phi 
     nxt = base + n_phi 
 
-    faces = np.empty((2 * n_cells, 3), dtype=int)
+    faces = np.empty((2 * n_cells, 3), dtype=dtype)
     # Triángulos pares (v0, v1, v2)
     faces[0::2, 0] = base + j
     faces[0::2, 1] = nxt  + j
@@ -63,7 +563,6 @@ def generate_mesh_from_vertices_numpy(n_theta, n_phi):
     faces[1::2, 0] = base + j
     faces[1::2, 1] = nxt  + j2
     faces[1::2, 2] = base + j2    
-
     return faces
 
 
@@ -75,11 +574,106 @@ def compute_normal(p1, p2, p3):
     return n / norm if norm else n
 
 
+def unit_normals(tri, out):
+    """Normales unitarias de los triángulos tri (n x 3 x 3), escritas en out."""
+    e1 = tri[:, 1] - tri[:, 0]
+    e2 = tri[:, 2] - tri[:, 0]
+    out[:, 0] = e1[:, 1]*e2[:, 2] - e1[:, 2]*e2[:, 1]
+    out[:, 1] = e1[:, 2]*e2[:, 0] - e1[:, 0]*e2[:, 2]
+    out[:, 2] = e1[:, 0]*e2[:, 1] - e1[:, 1]*e2[:, 0]
+    norm = np.sqrt(np.einsum('ij,ij->i', out, out))[:, None]
+    np.divide(out, norm, out=out, where=norm > 0)
+    return out
+
+
 # ===============
 #   EXPORT TO STL 
 # ===============
 
-def export_to_stl(filename, vertices, faces, solid_name="surface"):
+# Registro binario STL: normal, tres vértices y attribute byte count (50 bytes).
+STL_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attr', '<u2'),
+])
+
+
+def stl_records(vertices, faces):
+    """
+    Empaqueta las caras en un arreglo estructurado con el formato STL binario.
+    Los vértices se copian directamente al registro y las normales se
+    calculan desde ahí, en float32.
+    """
+    faces = np.asarray(faces)
+    if len(faces) and faces.max() >= len(vertices):
+        raise IndexError("face index out of range")
+
+    # np.zeros: np.take copia out antes de escribir y no debe leer basura
+    records = np.zeros(len(faces), dtype=STL_DTYPE)
+    tri = records['vertices']
+    np.take(vertices, faces, axis=0, out=tri, mode='clip')
+    unit_normals(tri, records['normal'])
+    return records
+
+
+def stl_header(solid_name="surface"):
+    """Cabecera de 80 bytes. No debe empezar con 'solid' para no confundirse con ASCII."""
+    return f"binary STL {solid_name}".encode("ascii", "replace")[:80].ljust(80, b"\0")
+
+
+@profiled("export_stl")
+def export_to_stl(filename, vertices, faces, solid_name="surface", binary=True):
+    """
+    Exporta la malla a STL. Por defecto escribe STL binario; con binary=False
+    se usa el formato ASCII.
+    """
+    if not binary:
+        return export_to_stl_ascii(filename, vertices, faces, solid_name)
+
+    records = stl_records(np.asarray(vertices), np.asarray(faces))
+    with open(filename, "wb") as f:
+        f.write(stl_header(solid_name))
+        f.write(np.uint32(len(records)).tobytes())
+        records.tofile(f)
+
+    print(f"Archivo STL generado: {filename}")
+
+
+@profiled("export_stl_stream")
+def export_revolved_stl(filename, curve_pts, n_ang, chunk_size=1_000_000,
+                        solid_name="surface"):
+    """
+    Exporta en STL binario la superficie de revolución de curve_pts sin
+    construir la malla completa en memoria.
+
+    La superficie se genera por bandas de anillos y cada banda se escribe
+    directamente al archivo. chunk_size es el número máximo aproximado de
+    triángulos por banda (como mínimo se procesa una banda de un anillo,
+    es decir 2*n_phi triángulos). El número de triángulos de la cabecera se
+    escribe al final. curve_pts puede ser también un RevolvedMesh (y entonces
+    n_ang se ignora).
+    """
+    # El STL guarda float32: los anillos se generan directamente en ese tipo
+    mesh = curve_pts if isinstance(curve_pts, RevolvedMesh) \
+        else RevolvedMesh(curve_pts, n_ang, dtype=np.float32)
+    rows = max(1, chunk_size // (2*mesh.n_phi))
+
+    n_tri = 0
+    with open(filename, "wb") as f:
+        f.write(stl_header(solid_name))
+        f.write(np.uint32(0).tobytes())
+
+        for verts, faces in mesh.iter_bands(rows):
+            stl_records(verts, faces).tofile(f)
+            n_tri += len(faces)
+
+        f.seek(80)
+        f.write(np.uint32(n_tri).tobytes())
+
+    print(f"Archivo STL generado: {filename}")
+
+
+def export_to_stl_ascii(filename, vertices, faces, solid_name="surface"):
     with open(filename, "w") as f:
         f.write(f"solid {solid_name}\n")
         for tri in faces:
@@ -100,7 +694,185 @@ def export_to_stl_trimesh(filename, vertices, faces, solid_name="surface"):
     """
     Exporta la malla a un archivo STL usando trimesh para máxima velocidad.
     """
+    import trimesh  # dependencia opcional
+
     mesh = trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
     mesh.export(filename)
     print(f"Archivo STL generado con trimesh: {filename}")
 
+
+# ==================================
+#   FORMATOS INDEXADOS: PLY, OBJ, 3MF
+# ==================================
+
+def format_rows(row_fmt, arr, chunk=100_000):
+    """
+    Texto de las filas de arr con row_fmt (p.ej. "v %.9g %.9g %.9g\\n"),
+    por bloques: un solo formateo por bloque, sin bucle por fila.
+    """
+    arr = np.asarray(arr)
+    for i in range(0, len(arr), chunk):
+        block = arr[i:i+chunk]
+        yield (row_fmt * len(block)) % tuple(block.ravel().tolist())
+
+
+def export_to_ply(filename, vertices, faces, normals=None):
+    """
+    PLY binario little-endian: vértices float32 y caras con índices uint32.
+    Con normals (por vértice) se añaden las propiedades nx, ny, nz.
+    """
+    write_ply(filename, len(vertices), len(faces), [vertices], [faces],
+              None if normals is None else [normals])
+
+
+@profiled("export_ply")
+def write_ply(filename, n_vertices, n_faces, vertex_blocks, face_blocks,
+              normal_blocks=None):
+    """Escribe un PLY binario a partir de bloques de vértices, caras y normales."""
+    normal_props = "property float nx\nproperty float ny\nproperty float nz\n"
+    header = (
+        "ply\n"
+        "format binary_little_endian 1.0\n"
+        f"element vertex {n_vertices}\n"
+        "property float x\n"
+        "property float y\n"
+        "property float z\n"
+        f"{normal_props if normal_blocks is not None else ''}"
+        f"element face {n_faces}\n"
+        "property list uchar uint vertex_indices\n"
+        "end_header\n"
+    )
+    with open(filename, "wb") as f:
+        f.write(header.encode("ascii"))
+        if normal_blocks is None: 
+            for block in vertex_blocks:
+                np.ascontiguousarray(block, dtype='<f4').tofile(f)
+        else: 
+            for block, normals in zip(vertex_blocks, normal_blocks): 
+                rec = np.empty((len(block), 6), dtype='<f4')
+                rec[:, :3] = block
+                rec[:, 3:] = normals
+                rec.tofile(f)
+        for block in face_blocks:
+            face_rec = np.empty(len(block), dtype=[('n', 'u1'), ('v', '<u4', (3,))])
+            face_rec['n'] = 3
+            face_rec['v'] = block
+            face_rec.tofile(f)
+
+    print(f"Archivo PLY generado: {filename}")
+
+
+def export_to_obj(filename, vertices, faces, normals=None):
+    """OBJ en texto (índices desde 1); con normals se escriben líneas vn."""
+    write_obj(filename, [vertices], [faces], None if normals is None else [normals])
+
+
+@profiled("export_obj")
+def write_obj(filename, vertex_blocks, face_blocks, normal_blocks=None):
+    with open(filename, "w") as f:
+        for block in vertex_blocks:
+            for text in format_rows("v %.9g %.9g %.9g\n", block):
+                f.write(text)
+        if normal_blocks is not None: 
+            for block in normal_blocks: 
+                for text in format_rows("vn %.7g %.7g %.7g\n", block): 
+                    f.write(text)
+        # La normal de cada vértice tiene su mismo índice: f v//vn
+        row_fmt = "f %d %d %d\n" if normal_blocks is None else "f %d//%d %d//%d %d//%d\n"
+        for block in face_blocks:
+            block = np.asarray(block, dtype=np.int64) + 1
+            if normal_blocks is not None: 
+                block = np.repeat(block, 2, axis=1)
+            for text in format_rows(row_fmt, block):
+                f.write(text)
+
+    print(f"Archivo OBJ generado: {filename}")
+
+
+_3MF_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+ <Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+ <Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>
+</Types>
+"""
+
+_3MF_RELS = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+ <Relationship Target="/3D/3dmodel.model" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>
+</Relationships>
+"""
+
+
+def export_to_3mf(filename, vertices, faces, unit="centimeter"):
+    """3MF (zip) con un único objeto; las unidades de la curva son cm."""
+    write_3mf(filename, [vertices], [faces], unit)
+
+
+@profiled("export_3mf")
+def write_3mf(filename, vertex_blocks, face_blocks, unit="centimeter"):
+    import zipfile
+
+    with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _3MF_CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _3MF_RELS)
+        with zf.open("3D/3dmodel.model", "w", force_zip64=True) as raw:
+            w = lambda text: raw.write(text.encode("utf-8"))
+            w('<?xml version="1.0" encoding="UTF-8"?>\n'
+              f'<model unit="{unit}" xml:lang="en-US" '
+              'xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n'
+              ' <resources>\n  <object id="1" type="model">\n   <mesh>\n    <vertices>\n')
+            for block in vertex_blocks:
+                for text in format_rows('     <vertex x="%.9g" y="%.9g" z="%.9g"/>\n', block):
+                    w(text)
+            w('    </vertices>\n    <triangles>\n')
+            for block in face_blocks:
+                for text in format_rows('     <triangle v1="%d" v2="%d" v3="%d"/>\n', block):
+                    w(text)
+            w('    </triangles>\n   </mesh>\n  </object>\n </resources>\n'
+              ' <build>\n  <item objectid="1"/>\n </build>\n</model>\n')
+
+    print(f"Archivo 3MF generado: {filename}")
+
+
+MESH_WRITERS = {
+    '.stl': export_to_stl,
+    '.ply': export_to_ply,
+    '.obj': export_to_obj,
+    '.3mf': export_to_3mf,
+}
+
+
+def export_mesh(filename, vertices, faces=None, **kwargs):
+    """
+    Exporta la malla en el formato indicado por la extensión de filename.
+
+    vertices puede ser un RevolvedMesh (sin faces): STL binario, PLY, OBJ y
+    3MF se escriben entonces por bloques de anillos sin materializar la malla
+    (PLY y OBJ con sus normales, si las tiene).
+
+    normals (por vértice) solo se usa en PLY y OBJ; STL guarda la normal
+    geométrica de cada faceta y 3MF no tiene normales.
+    """
+    normals = kwargs.pop('normals', None)
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in MESH_WRITERS:
+        raise ValueError(f"Formato no soportado: {ext} (usar {', '.join(MESH_WRITERS)})")
+
+    if isinstance(vertices, RevolvedMesh):
+        mesh = vertices
+        if ext == '.stl' and kwargs.get('binary', True):
+            return export_revolved_stl(filename, mesh, None, **{k: v for k, v in kwargs.items()
+                                                               if k != 'binary'})
+        normals = mesh.iter_normals() if mesh.has_normals else None
+        if ext == '.ply':
+            return write_ply(filename, mesh.n_vertices, mesh.n_faces,
+                             mesh.iter_vertices(), mesh.iter_faces(), normals)
+        if ext == '.obj':
+            return write_obj(filename, mesh.iter_vertices(), mesh.iter_faces(), normals)
+        if ext == '.3mf':
+            return write_3mf(filename, mesh.iter_vertices(), mesh.iter_faces(), **kwargs)
+        vertices, faces = mesh.materialize()
+
+    if normals is not None and ext in ('.ply', '.obj'): 
+        kwargs['normals'] = normals
+    return MESH_WRITERS[ext](filename, vertices, faces, **kwargs)
@@ -0,0 +1,139 @@
+# sweep.py
+
+# Barridos de parámetros: genera muchas lentes en paralelo.
+
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from cache import MeshCache, lens_mesh
+from surface_generation import export_to_stl
+
+
+def expand_grid(base, **axes):
+    """
+    Lista de parámetros con el producto cartesiano de los ejes sobre base.
+
+    expand_grid(params, t=[2, 3, 4], n1=[1.5, 1.6]) -> 6 dicts
+    """
+    keys = list(axes)
+    return [dict(base, **dict(zip(keys, values)))
+            for values in itertools.product(*(axes[k] for k in keys))]
+
+
+class SharedMesh:
+    """
+    Malla (vertices, faces) en memoria compartida creada por un proceso
+    del barrido. Hay que llamar a close() para liberar la memoria.
+    """
+
+    def __init__(self, spec):
+        self._shm = []
+        self.vertices = self._attach(*spec['vertices'])
+        self.faces = self._attach(*spec['faces'])
+
+    def _attach(self, name, shape, dtype):
+        shm = shared_memory.SharedMemory(name=name)
+        self._shm.append(shm)
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    def close(self):
+        self.vertices = self.faces = None
+        for shm in self._shm:
+            shm.close()
+            shm.unlink()
+        self._shm = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _to_shared(arr):
+    """Copia arr a un bloque nuevo de memoria compartida y devuelve su descripción."""
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    spec = (shm.name, arr.shape, arr.dtype.str)
+    # El bloque pasa a ser del proceso principal: que el proceso del
+    # barrido no lo borre al terminar.
+    resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+    return spec
+
+
+def _run_job(i, params, n_rho, n_ang, filename, return_mesh, binary, cache_dir,
+             dtype, watertight):
+    """Pipeline completo de una lente dentro de un proceso del barrido."""
+    out = {'index': i, 'params': params, 'file': filename,
+           'mesh': None, 'error': None}
+    try:
+        cache = None if cache_dir is None else MeshCache(cache_dir)
+        mesh = lens_mesh(params, n_rho, n_ang, watertight=watertight, cache=cache,
+                         dtype=dtype)
+        vertices, faces = mesh['vertices'], mesh['faces']
+
+        if filename is not None:
+            export_to_stl(filename, vertices, faces, binary=binary)
+        if return_mesh:
+            out['mesh'] = {'vertices': _to_shared(vertices),
+                           'faces': _to_shared(np.ascontiguousarray(faces))}
+
+        z, r = mesh['intersection'][2:]
+        out['intersection_point'] = (float(z), float(r))
+        out['diameter'] = 2*float(r)
+    except Exception as e:
+        out['error'] = f"{type(e).__name__}: {e}"
+    return out
+
+
+def run_sweep(param_sets, n_rho, n_ang, out_dir=None, workers=None,
+              return_meshes=False, binary=True, cache_dir=None, dtype=np.float64,
+              watertight=True):
+    """
+    Genera todas las lentes de param_sets en un pool de procesos.
+
+    Parámetros:
+      param_sets:    lista de dicts con las claves de params.json
+      n_rho, n_ang:  discretización de cada lente
+      out_dir:       si se indica, cada proceso escribe lens_XXXXX.stl allí
+                     y se guarda un índice sweep.json
+      workers:       número de procesos (por defecto, todos los núcleos)
+      return_meshes: devolver las mallas como SharedMesh en 'mesh'
+      cache_dir:     directorio de una MeshCache para reutilizar resultados
+      dtype:         tipo de los vértices (np.float32 reduce a la mitad la
+                     memoria compartida de las mallas)
+      watertight:    mallas cerradas en el eje (ver revolve_curve)
+
+    Retorna una lista de dicts (en el orden de param_sets) con 'params',
+    'file', 'diameter', 'intersection_point', 'mesh' y 'error'.
+    """
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+
+    results = [None]*len(param_sets)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for i, params in enumerate(param_sets):
+            filename = None if out_dir is None else os.path.join(out_dir, f"lens_{i:05d}.stl")
+            futures.append(pool.submit(_run_job, i, params, n_rho, n_ang,
+                                       filename, return_meshes, binary, cache_dir,
+                                       dtype, watertight))
+
+        for fut in as_completed(futures):
+            res = fut.result()
+            if res['mesh'] is not None:
+                res['mesh'] = SharedMesh(res['mesh'])
+            results[res['index']] = res
+
+    if out_dir is not None:
+        index = [{k: v for k, v in res.items() if k != 'mesh'} for res in results]
+        with open(os.path.join(out_dir, "sweep.json"), "w") as f:
+            json.dump(index, f, indent=2)
+
+    return results
@@ -0,0 +1,61 @@
+# batch_checks.py
+
+# Comprobaciones rápidas con assert (sin pytest): la intersección en lote de
+# solve_lens_batch coincide con la de OmegaLens lente a lente, también
+# arrancada en caliente desde una lente lejana (rho0).
+#
+#   python tests/batch_checks.py
+
+import os
+import sys
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from singlet import OmegaLens, solve_lens_batch
+
+
+def random_lenses(n, seed):
+    """z1, z2, n1 y t de n lentes al azar, casi todas con intersección."""
+    rng = np.random.default_rng(seed)
+    return (rng.uniform(10, 100, n), rng.uniform(5, 80, n),
+            rng.uniform(1.4, 1.8, n), rng.uniform(0.5, 8, n))
+
+
+def check_against_scalar(batch, z1, z2, n1, t):
+    """Cada lente que OmegaLens resuelve converge en batch al mismo punto."""
+    solved = 0
+    for i in range(len(z1)):
+        params = {'z0': 1e5, 'z1': z1[i], 'z2': z2[i], 'n0': 1.0, 'n1': n1[i], 't': t[i]}
+        try:
+            z, r = OmegaLens.from_params(params, 10).intersection_point
+        except (RuntimeError, ValueError):
+            continue
+        solved += 1
+        assert batch['converged'][i], params
+        assert abs(batch['z'][i] - z) < 1e-8 and abs(batch['r'][i] - r) < 1e-8, params
+    assert solved > len(z1) // 2
+
+
+def check_batch_intersection(n=300, seed=0):
+    z1, z2, n1, t = random_lenses(n, seed)
+    check_against_scalar(solve_lens_batch(1e5, z1, z2, 1.0, n1, t), z1, z2, n1, t)
+
+
+def check_warm_start(n=300, seed=1):
+    # Casi todas lejos de la nominal: Newton desde rho0 cae a menudo en otro
+    # cruce y esas lentes tienen que volver al barrido
+    nominal = {'z0': 1e5, 'z1': 60.0, 'z2': 30.0, 'n0': 1.0, 'n1': 1.5, 't': 4.0}
+    rho0 = OmegaLens.from_params(nominal, 2).rho_intersection
+    z1, z2, n1, t = random_lenses(n, seed)
+    check_against_scalar(solve_lens_batch(1e5, z1, z2, 1.0, n1, t, rho0=rho0),
+                         z1, z2, n1, t)
+
+
+if __name__ == "__main__":
+    warnings.simplefilter('ignore', RuntimeWarning)
+    check_batch_intersection()
+    check_warm_start()
+    print("ok")
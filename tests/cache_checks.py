@@ -0,0 +1,81 @@
+# cache_checks.py
+
+# Comprobaciones rápidas con assert (sin pytest):
+#   - lens_mesh con caché da, al fallar y al acertar, los mismos arreglos
+#     que sin caché; los aciertos son de solo lectura;
+#   - la clave cambia con los parámetros ópticos y la discretización, pero no
+#     con claves que no afectan a la malla;
+#   - evict deja la caché por debajo de max_bytes e invalidate la vacía.
+#
+#   python tests/cache_checks.py
+
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cache import MeshCache, cache_key, lens_mesh
+
+PARAMS = {'z0': 100000.0, 'z1': 60.0, 'z2': 30.0, 'n0': 1.0, 'n1': 1.5, 't': 4.0}
+
+
+def check_round_trip(root):
+    cache = MeshCache(root)
+    fresh = lens_mesh(PARAMS, 40, 24)
+    miss = lens_mesh(PARAMS, 40, 24, cache=cache)
+    hit = lens_mesh(PARAMS, 40, 24, cache=cache)
+    assert len(cache.entries()) == 1
+    for name, arr in fresh.items():
+        assert np.array_equal(miss[name], arr), name
+        assert np.array_equal(hit[name], arr), name
+        assert hit[name].dtype == arr.dtype, name
+        assert not hit[name].flags.writeable, name
+    hit32 = lens_mesh(PARAMS, 40, 24, cache=cache, dtype=np.float32)
+    assert hit32['vertices'].dtype == np.float32
+    assert len(cache.entries()) == 2
+
+
+def check_keys():
+    key = cache_key(PARAMS, n_rho=40, n_ang=24)
+    assert key == cache_key(dict(PARAMS, N_RHO=1000, output='x.stl'), n_rho=40, n_ang=24)
+    assert key == cache_key(dict(PARAMS, t=4), n_rho=40, n_ang=24)
+    assert key != cache_key(dict(PARAMS, t=4.001), n_rho=40, n_ang=24)
+    assert key != cache_key(PARAMS, n_rho=40, n_ang=25)
+    assert key != cache_key(PARAMS, n_rho=40, n_ang=24, watertight=True)
+
+
+def check_evict_invalidate(root):
+    cache = MeshCache(root)
+    for t in (3.0, 3.5, 4.0):
+        lens_mesh(dict(PARAMS, t=t), 40, 24, cache=cache)
+        # mtime distinto para un orden LRU determinista
+        time.sleep(0.01)
+    sizes = [size for _, size, _ in cache.entries()]
+    assert len(sizes) == 3
+
+    # La más antigua (t=3.0) sale primero; un acierto la renueva
+    lens_mesh(dict(PARAMS, t=3.0), 40, 24, cache=cache)
+    cache.max_bytes = sum(sizes) - 1
+    cache.evict()
+    left = {key for key, _, _ in cache.entries()}
+    assert len(left) == 2
+    assert cache_key(dict(PARAMS, t=3.0), n_rho=40, n_ang=24, watertight=True,
+                     dtype='<f8') in left
+
+    assert cache.invalidate() == 2
+    assert cache.entries() == []
+
+
+if __name__ == "__main__":
+    warnings.simplefilter('ignore', RuntimeWarning)
+    check_keys()
+    with tempfile.TemporaryDirectory() as root:
+        check_round_trip(root)
+    with tempfile.TemporaryDirectory() as root:
+        check_evict_invalidate(root)
+    print("ok")
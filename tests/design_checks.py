@@ -0,0 +1,82 @@
+# design_checks.py
+
+# Comprobaciones rápidas con assert (sin pytest): la lente que devuelve
+# solve_design es la de OmegaLens.from_params con los parámetros resueltos
+# (misma intersección) y cumple los objetivos medidos sobre esa lente; un
+# objetivo fuera de alcance es un error y no una lente en un segundo cruce
+# de Σ₁ con Σ₂.
+#
+#   python tests/design_checks.py
+
+import os
+import sys
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from design import rho_at_radius, solve_design
+from singlet import OmegaLens
+
+PARAMS = {'z0': 100000.0, 'z1': 60.0, 'z2': 30.0, 'n0': 1.0, 'n1': 1.5, 't': 4.0}
+
+# (objetivos, parámetros libres, edge_radius)
+CASES = [
+    ({'diameter': 25.0}, ['z2'], None),
+    ({'diameter': 18.0}, ['z2'], None),
+    ({'diameter': 22.0}, ['z1'], None),
+    ({'diameter': 22.0}, ['t'], None),
+    ({'center_thickness': 5.0}, ['t'], None),
+    ({'diameter': 22.0, 'edge_thickness': 1.5}, ['z2', 't'], 8.0),
+    ({'edge_thickness': 1.0}, ['z1', 'z2'], 8.0),
+]
+
+# Con z1 el diámetro no baja de ~16.9: Newton acababa en una raíz de
+# diámetro 15 que no es el primer cruce
+OUT_OF_REACH = [({'diameter': 15.0}, ['z1'], None)]
+
+
+def measured(lens, targets, edge_radius):
+    """Valor de cada objetivo medido sobre lens."""
+    out = {}
+    for name in targets:
+        if name == 'diameter':
+            out[name] = 2*lens.intersection_point[1]
+        elif name == 'center_thickness':
+            out[name] = lens.s2.compiled.t_shift
+        else:
+            f1, f2 = lens.s1.compiled, lens.s2.compiled
+            z1 = f1.zr(rho_at_radius(f1, edge_radius))[0]
+            z2 = f2.zr(rho_at_radius(f2, edge_radius))[0]
+            out[name] = z2 - z1
+    return out
+
+
+def check_against_from_params():
+    for targets, free, edge_radius in CASES:
+        res = solve_design(PARAMS, targets, free, edge_radius)
+        lens = OmegaLens.from_params(res['params'], 10)
+        for a, b in zip(res['rho_intersection'], lens.rho_intersection):
+            assert abs(a - b) < 1e-8, (targets, free)
+        for a, b in zip(res['intersection_point'], lens.intersection_point):
+            assert abs(a - b) < 1e-8, (targets, free)
+        for name, value in measured(lens, targets, edge_radius).items():
+            assert abs(value - targets[name]) < 1e-8, (targets, free, name, value)
+
+
+
+def check_out_of_reach():
+    for targets, free, edge_radius in OUT_OF_REACH:
+        try:
+            res = solve_design(PARAMS, targets, free, edge_radius)
+        except RuntimeError:
+            continue
+        point = OmegaLens.from_params(res['params'], 10).intersection_point
+        raise AssertionError(f"{targets} con {free}: r = {res['intersection_point'][1]}, "
+                             f"from_params da r = {point[1]}")
+
+
+if __name__ == "__main__":
+    warnings.simplefilter('ignore', RuntimeWarning)
+    check_against_from_params()
+    check_out_of_reach()
+    print("ok")
@@ -0,0 +1,144 @@
+# export_checks.py
+
+# Comprobaciones rápidas con assert (sin pytest):
+#   - el STL binario tiene una faceta por cara;
+#   - PLY, OBJ y 3MF se leen de vuelta con la cabecera, el número de
+#     vértices y caras, los vértices y las caras de la malla exportada (PLY
+#     también con normales);
+#   - exportar un RevolvedMesh por bloques da el mismo archivo que exportar
+#     la malla materializada.
+#
+#   python tests/export_checks.py
+
+import contextlib
+import io
+import os
+import re
+import sys
+import tempfile
+import warnings
+import zipfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from singlet import OmegaLens
+from surface_generation import RevolvedMesh, export_mesh, revolve_curve
+
+PARAMS = {'z0': 100000.0, 'z1': 60.0, 'z2': 30.0, 'n0': 1.0, 'n1': 1.5, 't': 4.0}
+
+
+def export_quiet(*args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        export_mesh(*args, **kwargs)
+
+
+def read_ply(filename):
+    """(vértices, caras, normales o None) de un PLY binario de write_ply."""
+    with open(filename, "rb") as f:
+        data = f.read()
+    end = data.index(b"end_header\n") + len(b"end_header\n")
+    header = data[:end].decode("ascii").splitlines()
+    assert header[:2] == ["ply", "format binary_little_endian 1.0"], header
+    n_vertices = int(re.search(r"^element vertex (\d+)$", "\n".join(header), re.M)[1])
+    n_faces = int(re.search(r"^element face (\d+)$", "\n".join(header), re.M)[1])
+    props = [line.split()[-1] for line in header if line.startswith("property float")]
+    assert props in (["x", "y", "z"], ["x", "y", "z", "nx", "ny", "nz"]), props
+
+    vert = np.frombuffer(data, '<f4', n_vertices*len(props), end).reshape(n_vertices, -1)
+    rec = np.frombuffer(data, [('n', 'u1'), ('v', '<u4', (3,))], n_faces,
+                        end + vert.nbytes)
+    assert np.all(rec['n'] == 3)
+    assert end + vert.nbytes + rec.nbytes == len(data), "bytes sobrantes tras las caras"
+    return vert[:, :3], rec['v'], (vert[:, 3:] if len(props) == 6 else None)
+
+
+def read_obj(filename):
+    """(vértices, caras con índices desde 0) de un OBJ de write_obj."""
+    v, f = [], []
+    with open(filename) as fh:
+        for line in fh:
+            kind, *rest = line.split()
+            if kind == 'v':
+                v.append([float(x) for x in rest])
+            elif kind == 'f':
+                f.append([int(x.split('//')[0]) - 1 for x in rest])
+    return np.array(v), np.array(f)
+
+
+def read_3mf(filename):
+    """(vértices, caras) del único objeto de un 3MF de write_3mf."""
+    with zipfile.ZipFile(filename) as zf:
+        assert {"[Content_Types].xml", "_rels/.rels", "3D/3dmodel.model"} <= set(zf.namelist())
+        model = zf.read("3D/3dmodel.model").decode("utf-8")
+    assert '<model unit="centimeter"' in model
+    num = r'"([^"]+)"'
+    v = re.findall(rf'<vertex x={num} y={num} z={num}/>', model)
+    f = re.findall(rf'<triangle v1={num} v2={num} v3={num}/>', model)
+    assert len(v) == model.count('<vertex ') and len(f) == model.count('<triangle ')
+    return np.array(v, dtype=float), np.array(f, dtype=np.int64)
+
+
+def check_round_trip(tmp):
+    lens = OmegaLens.from_params(PARAMS, 40)
+    vertices, faces, normals = revolve_curve(lens.get_points(), 24, watertight=True,
+                                             tangents=lens.get_tangents())
+
+    path = os.path.join(tmp, "lens.stl")
+    export_quiet(path, vertices, faces)
+    with open(path, "rb") as fh:
+        data = fh.read()
+    assert int(np.frombuffer(data, '<u4', 1, 80)[0]) == len(faces)
+    assert len(data) == 84 + 50*len(faces)
+
+    path = os.path.join(tmp, "lens.ply")
+    export_quiet(path, vertices, faces, normals=normals)
+    v, f, n = read_ply(path)
+    assert (len(v), len(f)) == (len(vertices), len(faces))
+    assert np.array_equal(v, vertices.astype(np.float32))
+    assert np.array_equal(f, faces)
+    assert np.array_equal(n, normals.astype(np.float32))
+    export_quiet(path, vertices, faces)
+    assert read_ply(path)[2] is None
+
+    path = os.path.join(tmp, "lens.obj")
+    export_quiet(path, vertices, faces)
+    v, f = read_obj(path)
+    assert np.allclose(v, vertices, rtol=1e-8, atol=1e-12)
+    assert np.array_equal(f, faces)
+
+    path = os.path.join(tmp, "lens.3mf")
+    export_quiet(path, vertices, faces)
+    v, f = read_3mf(path)
+    assert np.allclose(v, vertices, rtol=1e-8, atol=1e-12)
+    assert np.array_equal(f, faces)
+
+
+def check_streamed(tmp):
+    lens = OmegaLens.from_params(PARAMS, 40)
+    curve, tangents = lens.get_points(), lens.get_tangents()
+    for watertight in (False, True):
+        mesh = RevolvedMesh(curve, 24, tangents=tangents, watertight=watertight)
+        vertices, faces = mesh.materialize()
+        normals = mesh.vertex_normals()
+        for ext in ('.stl', '.ply', '.obj', '.3mf'):
+            streamed = os.path.join(tmp, "streamed" + ext)
+            whole = os.path.join(tmp, "whole" + ext)
+            export_quiet(streamed, mesh)
+            export_quiet(whole, vertices, faces,
+                         normals=normals if ext in ('.ply', '.obj') else None)
+            if ext == '.3mf':
+                with zipfile.ZipFile(streamed) as a, zipfile.ZipFile(whole) as b:
+                    assert all(a.read(name) == b.read(name) for name in b.namelist())
+            else:
+                with open(streamed, "rb") as a, open(whole, "rb") as b:
+                    assert a.read() == b.read(), (ext, watertight)
+
+
+if __name__ == "__main__":
+    warnings.simplefilter('ignore', RuntimeWarning)
+    with tempfile.TemporaryDirectory() as tmp:
+        check_round_trip(tmp)
+        check_streamed(tmp)
+    print("ok")
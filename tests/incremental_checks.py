@@ -0,0 +1,81 @@
+# incremental_checks.py
+
+# Comprobaciones rápidas con assert (sin pytest):
+#   - replace da la lente de reconstruir ambas sigmas con el mismo arranque
+#     en caliente (y la de from_params dentro de la tolerancia de Newton),
+#     también tras saltos grandes de los parámetros;
+#   - update_revolved da, bit a bit, la malla de revolve_curve.
+#
+#   python tests/incremental_checks.py
+
+import os
+import sys
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from singlet import OmegaLens, SigmaCurve
+from surface_generation import revolve_curve, update_revolved
+
+PARAMS = {'z0': 100000.0, 'z1': 60.0, 'z2': 30.0, 'n0': 1.0, 'n1': 1.5, 't': 4.0}
+
+# Variaciones de la lente nominal
+VARIANTS = [{}, {'t': 2.5}, {'t': 7.0}, {'z1': 40.0}, {'z2': 45.0, 'n1': 1.7}]
+
+# Saltos grandes desde la nominal: el arranque en caliente puede caer en un
+# segundo cruce de Σ₁ con Σ₂ (como con z1=29.09, z2=49.65, t=4.58, n1=1.663)
+JUMPS = 200
+
+
+def check_replace(lens):
+    for changes in VARIANTS[1:]:
+        new = lens.replace(**changes)
+        args1, args2 = OmegaLens.curve_args(dict(PARAMS, **changes))
+        fresh = OmegaLens(SigmaCurve(**args1, rho_points=40),
+                          SigmaCurve(**args2, rho_points=40), rho0=lens.rho_intersection)
+        assert np.array_equal(new.get_points(), fresh.get_points())
+        assert np.array_equal(new.get_tangents(), fresh.get_tangents())
+        cold = OmegaLens.from_params(dict(PARAMS, **changes), 40)
+        assert np.allclose(new.get_points(), cold.get_points(), rtol=0, atol=1e-9)
+
+
+def check_jumps(lens, seed=1):
+    rng = np.random.default_rng(seed)
+    jumps = [{'z1': 29.09, 'z2': 49.65, 't': 4.58, 'n1': 1.663}]
+    jumps += [{'z1': rng.uniform(10, 100), 'z2': rng.uniform(5, 80),
+               't': rng.uniform(0.5, 8), 'n1': rng.uniform(1.4, 1.8)} for _ in range(JUMPS)]
+    for changes in jumps:
+        try:
+            cold = OmegaLens.from_params(dict(PARAMS, **changes), 10)
+        except (RuntimeError, ValueError):
+            continue
+        z, r = lens.replace(rho_points=10, **changes).intersection_point
+        assert abs(z - cold.intersection_point[0]) < 1e-8, changes
+        assert abs(r - cold.intersection_point[1]) < 1e-8, changes
+
+
+def check_update_revolved(lens):
+    for changes in VARIANTS[1:]:
+        new = lens.replace(**changes)
+        for watertight in (False, True):
+            vertices, faces, normals = revolve_curve(lens.get_points(), 16, watertight,
+                                                     tangents=lens.get_tangents())
+            moved = update_revolved(vertices, lens.get_points(), new.get_points(), 16,
+                                    watertight, normals=normals, tangents=new.get_tangents())
+            assert moved is not None
+            v, f, n = revolve_curve(new.get_points(), 16, watertight,
+                                    tangents=new.get_tangents())
+            assert np.array_equal(vertices, v)
+            assert np.array_equal(faces, f)
+            assert np.array_equal(normals, n)
+
+
+if __name__ == "__main__":
+    warnings.simplefilter('ignore', RuntimeWarning)
+    lens = OmegaLens.from_params(PARAMS, 40)
+    check_replace(lens)
+    check_jumps(lens)
+    check_update_revolved(lens)
+    print("ok")
@@ -0,0 +1,75 @@
+# mesh_checks.py
+
+# Comprobaciones rápidas con assert (sin pytest): las mallas watertight y
+# adaptativas son variedades cerradas con las caras hacia afuera, y un
+# RevolvedMesh watertight recorrido por bloques de anillos da la misma malla
+# que revolve_curve.
+#
+#   python tests/mesh_checks.py
+
+import os
+import sys
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from singlet import OmegaLens
+from surface_generation import (RevolvedMesh, revolve_curve, revolve_curve_adaptive,
+                                signed_volume)
+
+PARAMS = {'z0': 100000.0, 'z1': 60.0, 'z2': 30.0, 'n0': 1.0, 'n1': 1.5, 't': 4.0}
+
+# Variaciones de la lente nominal
+VARIANTS = [{}, {'t': 2.5}, {'t': 7.0}, {'z1': 40.0}, {'z2': 45.0, 'n1': 1.7}]
+
+
+def check_closed_outward(vertices, faces):
+    """Cada arista en exactamente dos caras, recorrida una vez en cada sentido, y volumen > 0."""
+    edges = np.concatenate((faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]))
+    assert not np.any(edges[:, 0] == edges[:, 1]), "caras degeneradas"
+    directed, count = np.unique(edges, axis=0, return_counts=True)
+    assert np.all(count == 1), "arista con la misma orientación en dos caras"
+    undirected, count = np.unique(np.sort(edges, axis=1), axis=0, return_counts=True)
+    assert np.all(count == 2), "arista de borde o compartida por más de dos caras"
+    assert len(directed) == 2*len(undirected)
+    assert signed_volume(vertices, faces) > 0, "caras hacia adentro"
+
+
+def lens_curves():
+    """Perfil de cada variante, en el orden de VARIANTS."""
+    return [OmegaLens.from_params(dict(PARAMS, **changes), 40).get_points()
+            for changes in VARIANTS]
+
+
+def check_watertight(curves):
+    for curve in curves:
+        for n_ang in (3, 24):
+            check_closed_outward(*revolve_curve(curve, n_ang, watertight=True))
+
+
+def check_adaptive(curves):
+    for curve in curves:
+        for sag_tol in (0.1, 0.01):
+            vertices, faces = revolve_curve_adaptive(curve, sag_tol)
+            check_closed_outward(vertices, faces)
+
+
+def check_streamed(curves):
+    for curve in curves:
+        vertices, faces = revolve_curve(curve, 24, watertight=True)
+        mesh = RevolvedMesh(curve, 24, watertight=True)
+        assert (mesh.n_vertices, mesh.n_faces) == (len(vertices), len(faces))
+        for rows in (1, 7, 1024):
+            assert np.array_equal(np.concatenate(list(mesh.iter_vertices(rows))), vertices)
+            assert np.array_equal(np.concatenate(list(mesh.iter_faces(rows))), faces)
+
+
+if __name__ == "__main__":
+    warnings.simplefilter('ignore', RuntimeWarning)
+    curves = lens_curves()
+    check_watertight(curves)
+    check_adaptive(curves)
+    check_streamed(curves)
+    print("ok")
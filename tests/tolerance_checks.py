@@ -0,0 +1,50 @@
+# tolerance_checks.py
+
+# Comprobaciones rápidas con assert (sin pytest):
+#   - sin errores de fabricación todas las lentes son la nominal: mismo
+#     diámetro, sin desviación de forma y con la mancha de una lente
+#     estigmática;
+#   - con errores, el diámetro de cada lente perturbada coincide con el de
+#     OmegaLens.from_params con sus parámetros.
+#
+#   python tests/tolerance_checks.py
+
+import os
+import sys
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from singlet import OmegaLens
+from tolerance import TOLERANCED_KEYS, analyze_tolerances
+
+PARAMS = {'z0': 100000.0, 'z1': 60.0, 'z2': 30.0, 'n0': 1.0, 'n1': 1.5, 't': 4.0}
+
+
+def check_nominal(n=50):
+    res = analyze_tolerances(PARAMS, n, sigma=dict.fromkeys(TOLERANCED_KEYS, 0.0),
+                             spot_tol_um=1e-3, shape_tol_um=1e-3, n_rays=64)
+    out = res['outputs']
+    assert res['yield'] == 1.0
+    assert np.allclose(out['diameter'], res['nominal_diameter'], rtol=0, atol=1e-9)
+    assert np.all(out['shape_error_um'] < 1e-3)
+    assert np.all(out['vignetted'] == 0)
+
+
+def check_perturbed(n=40):
+    res = analyze_tolerances(PARAMS, n, n_rays=64)
+    samples, out = res['samples'], res['outputs']
+    for i in range(n):
+        params = dict(PARAMS, **{k: samples[k][i] for k in ('t', 'z1', 'z2')})
+        diameter = 2*OmegaLens.from_params(params, 10).intersection_point[1]
+        assert out['converged'][i]
+        assert abs(out['diameter'][i] - diameter) < 1e-8, params
+
+
+if __name__ == "__main__":
+    warnings.simplefilter('ignore', RuntimeWarning)
+    check_nominal()
+    check_perturbed()
+    print("ok")
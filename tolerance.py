@@ -0,0 +1,254 @@
+# tolerance.py
+
+# Análisis de tolerancias por Monte Carlo: miles de lentes con errores de
+# fabricación (t, n1, z1, z2) alrededor de la nominal, resueltas en lote
+# (intersección, perfil y trazado de rayos vectorizados), con el
+# rendimiento (fracción dentro de especificación) y las sensibilidades.
+#
+#   python main.py tolerance -p cola/params.json --samples 5000 --spot-tol-um 50
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from mesh_error import UM, profile_distance
+from profiling import profiled
+from raytrace import sample_pupil, pupil_rays, trace_rays
+from singlet import OmegaLens, compile_lens_batch, intersect_lens_batch
+
+# Desviaciones estándar por defecto de los errores de fabricación
+# (cm para t, z1 y z2; adimensional para n1)
+DEFAULT_SIGMA = {'t': 0.01, 'n1': 0.001, 'z1': 0.05, 'z2': 0.05}
+
+# Parámetros que se pueden perturbar
+TOLERANCED_KEYS = ('t', 'n1', 'z1', 'z2')
+
+# Salidas con signo sobre las que se calculan las sensibilidades
+LINEAR_OUTPUTS = ('diameter', 'focus_shift')
+
+# Puntos por sigma para la desviación de forma
+PROFILE_SAMPLES = 64
+
+
+def sample_perturbations(nominal, n, sigma=None, seed=0):
+    """
+    n conjuntos de parámetros con errores gaussianos de desviación sigma
+    (dict parámetro -> desviación) alrededor de nominal.
+
+    Retorna un dict parámetro -> arreglo de n valores.
+    """
+    sigma = DEFAULT_SIGMA if sigma is None else sigma
+    rng = np.random.default_rng(seed)
+    return {k: nominal[k] + s*rng.standard_normal(n) for k, s in sigma.items()}
+
+
+def _evaluate(nominal, samples, n, n_rays, fill):
+    """
+    Las n lentes perturbadas de samples frente a la nominal.
+
+    Las superficies se fabrican con la forma de z1, z2 y t perturbados y el
+    n1 de diseño; el vidrio real tiene el n1 perturbado, que solo entra en
+    el trazado. Se traza desde el objeto de diseño hasta el plano imagen de
+    diseño.
+    """
+    get = lambda k: samples.get(k, np.full(n, float(nominal[k])))
+    t, n1 = get('t'), get('n1')
+    n0, z0 = nominal['n0'], nominal['z0']
+
+    lens = OmegaLens.from_params(nominal, 2)
+    f1, f2 = compile_lens_batch(z0, get('z1'), get('z2'), n0, nominal['n1'], t)
+    # Arranque en caliente desde la intersección nominal
+    sol = intersect_lens_batch(f1, f2, rho0=lens.rho_intersection)
+    ok = sol['converged']
+    rho1, rho2, r = sol['rho1'], sol['rho2'], sol['r']
+
+    # Desviación de forma: puntos de cada sigma perturbada hasta su
+    # intersección, medidos contra el perfil nominal exacto
+    u = np.linspace(0, 1, PROFILE_SAMPLES)[1:]
+    shape_error = np.zeros(n)
+    for f, rho_i in ((f1, rho1), (f2, rho2)):
+        z, rr = f.take((slice(None), None)).zr(rho_i[:, None]*u)
+        d = profile_distance(lens, z, rr)
+        shape_error = np.maximum(shape_error, np.max(d, axis=1))
+
+    # Trazado: n_rays rayos por lente, cada uno con los coeficientes de la suya
+    px, py = sample_pupil(n_rays, fill)
+    good = np.flatnonzero(ok)
+    lens_of = np.repeat(good, n_rays)
+    x = (np.tile(px, len(good)) * r[lens_of])
+    y = (np.tile(py, len(good)) * r[lens_of])
+    origin, d, _ = pupil_rays(x, y, 0.0, -z0)
+    p1, p2, d2, hit = trace_rays(f1.take(lens_of), f2.take(lens_of),
+                                 rho1[lens_of], rho2[lens_of], origin, d,
+                                 n0, n1[lens_of], None)
+
+    z_image = nominal['z2']
+    slope = d2[:, :2] / d2[:, 2:3]
+    spot = p2[:, :2] + (z_image - p2[:, 2:3]) * slope
+
+    # Reducciones por lente (filas) de los rayos válidos
+    shape = (len(good), n_rays)
+    hit = hit.reshape(shape)
+    w = hit[..., None]
+    spot = np.where(w, spot.reshape(*shape, 2), 0.0)
+    slope = np.where(w, slope.reshape(*shape, 2), 0.0)
+    count = hit.sum(axis=1)
+    with np.errstate(all='ignore'):
+        centroid = spot.sum(axis=1) / count[:, None]
+        rms = np.sqrt(np.sum(np.where(w, spot - centroid[:, None], 0.0)**2, axis=(1, 2))
+                      / count)
+        # Mejor foco: δ que minimiza Σ|x + δ·u|² en cada lente
+        shift = -np.einsum('lrc,lrc->l', spot, slope) / np.einsum('lrc,lrc->l', slope, slope)
+        best = np.where(w, spot + shift[:, None, None]*slope, 0.0)
+        best_c = best.sum(axis=1) / count[:, None]
+        best_rms = np.sqrt(np.sum(np.where(w, best - best_c[:, None], 0.0)**2, axis=(1, 2))
+                           / count)
+
+    out = {
+        'diameter': sol['diameter'],
+        'shape_error_um': np.where(ok, shape_error / UM, np.nan),
+        'spot_rms_um': np.full(n, np.nan),
+        'focus_shift': np.full(n, np.nan),
+        'best_focus_rms_um': np.full(n, np.nan),
+        'vignetted': np.full(n, n_rays),
+    }
+    out['spot_rms_um'][good] = rms / UM
+    out['focus_shift'][good] = shift
+    out['best_focus_rms_um'][good] = best_rms / UM
+    out['vignetted'][good] = n_rays - count
+    out['converged'] = ok & (count > 0)
+    return out
+
+
+def sensitivities(samples, outputs, mask):
+    """
+    Pendientes d(salida)/d(parámetro) por mínimos cuadrados sobre las lentes
+    de mask, y la desviación estándar que aporta cada parámetro
+    (|pendiente|·σ del parámetro en la muestra). None si no hay lentes
+    suficientes o ningún parámetro varía.
+    """
+    keys = [k for k in samples if mask.any() and np.ptp(samples[k][mask]) > 0]
+    if not keys or mask.sum() <= len(keys):
+        return None
+    X = np.column_stack([samples[k][mask] - samples[k][mask].mean() for k in keys])
+    res = {}
+    for name in LINEAR_OUTPUTS:
+        yv = outputs[name][mask]
+        coef, *_ = np.linalg.lstsq(X, yv - yv.mean(), rcond=None)
+        res[name] = {k: {'slope': float(c), 'std_contribution': float(abs(c)*X[:, i].std())}
+                     for i, (k, c) in enumerate(zip(keys, coef))}
+    return res
+
+
+@profiled("tolerance")
+def analyze_tolerances(params, n=5000, sigma=None, diameter_tol=None,
+                       spot_tol_um=None, focus_tol=None, shape_tol_um=None,
+                       n_rays=256, fill=0.95, seed=0, workers=None,
+                       chunk=2000):
+    """
+    Análisis de tolerancias por Monte Carlo de la lente de params
+    (parámetros físicos).
+
+    Parámetros:
+      n:            número de lentes perturbadas
+      sigma:        dict parámetro -> desviación estándar (DEFAULT_SIGMA)
+      diameter_tol: |diámetro - nominal| máximo (cm)
+      spot_tol_um:  radio RMS máximo de la mancha en el plano imagen de diseño
+      focus_tol:    desplazamiento máximo del mejor foco (cm)
+      shape_tol_um: desviación máxima del perfil respecto al nominal
+      n_rays:       rayos por lente
+      workers:      procesos para los bloques de chunk lentes (None o 1:
+                    en este proceso)
+
+    Las especificaciones que no se indican no se aplican. Retorna un dict
+    con las muestras ('samples'), las salidas por lente ('outputs'), la
+    máscara de lentes dentro de especificación ('passed'), el rendimiento
+    ('yield'), estadísticas por salida ('stats') y las sensibilidades de
+    diámetro y foco ('sensitivities').
+    """
+    if 'sigma1' in params:
+        raise ValueError("el análisis de tolerancias necesita parámetros físicos")
+    sigma = DEFAULT_SIGMA if sigma is None else sigma
+    unknown = set(sigma) - set(TOLERANCED_KEYS)
+    if unknown:
+        raise ValueError(f"parámetros sin tolerancia posible: {sorted(unknown)}")
+    nominal = dict(params)
+    nominal.setdefault('t', 0.0)
+    samples = sample_perturbations(nominal, n, sigma, seed)
+
+    starts = range(0, n, chunk)
+    blocks = [{k: v[i:i + chunk] for k, v in samples.items()} for i in starts]
+    sizes = [min(chunk, n - i) for i in starts]
+    if workers is None or workers == 1 or len(blocks) == 1:
+        parts = [_evaluate(nominal, b, m, n_rays, fill) for b, m in zip(blocks, sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            k = len(blocks)
+            parts = list(pool.map(_evaluate, [nominal]*k, blocks, sizes,
+                                  [n_rays]*k, [fill]*k))
+    outputs = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+    point = tuple(float(v) for v in OmegaLens.from_params(nominal, 2).intersection_point)
+    nominal_diameter = 2*point[1]
+    passed = outputs['converged'].copy()
+    with np.errstate(invalid='ignore'):
+        if diameter_tol is not None:
+            passed &= np.abs(outputs['diameter'] - nominal_diameter) <= diameter_tol
+        if spot_tol_um is not None:
+            passed &= outputs['spot_rms_um'] <= spot_tol_um
+        if focus_tol is not None:
+            passed &= np.abs(outputs['focus_shift']) <= focus_tol
+        if shape_tol_um is not None:
+            passed &= outputs['shape_error_um'] <= shape_tol_um
+
+    ok = outputs['converged']
+    stats = {}
+    for name, v in outputs.items():
+        if name == 'converged':
+            continue
+        v = v[ok]
+        stats[name] = {'mean': float(np.mean(v)), 'std': float(np.std(v)),
+                       'p5': float(np.percentile(v, 5)),
+                       'p95': float(np.percentile(v, 95))} if v.size else None
+
+    return {
+        'n': n,
+        'nominal_intersection': point,
+        'nominal_diameter': nominal_diameter,
+        'samples': samples,
+        'outputs': outputs,
+        'passed': passed,
+        'yield': float(passed.mean()) if n else 0.0,
+        'failed': int(n - ok.sum()),
+        'stats': stats,
+        'sensitivities': sensitivities(samples, outputs, ok),
+    }
+
+
+def print_report(res):
+    print(f'===== Tolerance analysis ({res["n"]} lenses) =====')
+    print(f'yield = {100*res["yield"]:.2f} % ({res["failed"]} unsolved)')
+    for name, s in res['stats'].items():
+        if s is not None:
+            print(f'{name:18s} mean {s["mean"]:.6g}  std {s["std"]:.4g}  '
+                  f'[p5 {s["p5"]:.6g}, p95 {s["p95"]:.6g}]')
+    if res['sensitivities']:
+        print('sensitivities (slope, std contribution):')
+        for name, sens in res['sensitivities'].items():
+            terms = ', '.join(f'd/d{k} {v["slope"]:.4g} ({v["std_contribution"]:.3g})'
+                              for k, v in sens.items())
+            print(f'  {name}: {terms}')
+
+
+def summary(res):
+    """Resultado de analyze_tolerances sin los arreglos por lente (para JSON)."""
+    return {k: v for k, v in res.items() if k not in ('samples', 'outputs', 'passed')}
+
+
+def parse_sigma(specs):
+    """['t=0.02', 'n1=0'] -> DEFAULT_SIGMA con esos valores cambiados."""
+    sigma = dict(DEFAULT_SIGMA)
+    for spec in specs:
+        key, _, value = spec.partition('=')
+        sigma[key] = float(value)
+    return sigma
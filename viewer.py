@@ -6,9 +6,38 @@ from vispy.visuals.filters import ShadingFilter, WireframeFilter
 import matplotlib.pyplot as plt
 
 
-def show_vispy(vertices, faces, TITLE_NAME='3D SCENE',
-               SHADING='flat', COLOR=[0.7, 0.7, 0.7, 1],
-               SHOW_WIREFRAME=False):
+def set_vertex_normals(mesh_data, normals):
+    """
+    Fija las normales por vértice de un MeshData de vispy para que no las
+    recalcule a partir de las caras.
+
+    MeshData no tiene un método público para esto: se escriben los atributos
+    privados que usa get_vertex_normals (comprobado con vispy 0.17.0). Si
+    una versión de vispy los cambia, se deja que calcule sus normales.
+    """
+    if not hasattr(mesh_data, '_vertex_normals') or \
+            not hasattr(mesh_data, '_vertex_normals_indexed_by_faces'):
+        return
+    mesh_data._vertex_normals = np.asarray(normals, dtype=np.float32)
+    mesh_data._vertex_normals_indexed_by_faces = None
+
+
+def show_vispy(vertices, faces=None, TITLE_NAME='3D SCENE',
+               SHADING=None, COLOR=[0.7, 0.7, 0.7, 1],
+               SHOW_WIREFRAME=False, normals=None):
+    """
+    Vista 3D de la malla. Con normals (analíticas, por vértice) el
+    sombreado es suave y vispy no recalcula las normales; sin ellas es plano.
+    """
+
+    # RevolvedMesh: la GPU necesita los arreglos completos
+    if faces is None and hasattr(vertices, 'materialize'):
+        if normals is None and vertices.has_normals:
+            normals = vertices.vertex_normals()
+        vertices, faces = vertices.materialize()
+
+    if SHADING is None:
+        SHADING = 'flat' if normals is None else 'smooth'
 
     canvas = scene.SceneCanvas(keys='interactive', show=True, title=TITLE_NAME)
     view = canvas.central_widget.add_view()
@@ -18,6 +47,8 @@ def show_vispy(vertices, faces, TITLE_NAME='3D SCENE',
                               faces=faces,
                               color=COLOR,
                               shading=SHADING)
+    if normals is not None:
+        set_vertex_normals(mesh.mesh_data, normals)
     view.add(mesh)
 
     if SHOW_WIREFRAME: